@@ -16,9 +16,10 @@ Usage:
 """
 
 import argparse
+import hashlib
 import sys
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple
 import numpy as np
 
 try:
@@ -88,8 +89,37 @@ def interpolate_path(waypoints: np.ndarray, spacing: float = 0.5) -> Tuple[np.nd
     return positions, np.array(headings)
 
 
+def load_or_build_points(cache_dir: Optional[str], name: str, key: str,
+                         build: Callable[[], np.ndarray]) -> np.ndarray:
+    """
+    Load a static point set from the cache, building and saving it if missing.
+
+    Args:
+        cache_dir: Cache directory (None disables caching)
+        name: Prefix for the cache file name
+        key: String identifying the parameters the points depend on
+        build: Function that computes the points
+
+    Returns:
+        Mx3 array of points
+    """
+    if cache_dir is None:
+        return build()
+
+    digest = hashlib.md5(key.encode()).hexdigest()[:12]
+    cache_path = Path(cache_dir) / f"{name}_{digest}.npy"
+    if cache_path.exists():
+        return np.load(str(cache_path))
+
+    points = build()
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    np.save(str(cache_path), points)
+    return points
+
+
 def create_environment_walls(route_center: np.ndarray, corridor_width: float = 2.0,
-                            wall_height: float = 2.0, point_density: float = 0.05) -> np.ndarray:
+                            wall_height: float = 2.0, point_density: float = 0.05,
+                            cache_dir: Optional[str] = None) -> np.ndarray:
     """
     Create wall points around the rectangular route with distinctive features.
 
@@ -98,6 +128,8 @@ def create_environment_walls(route_center: np.ndarray, corridor_width: float = 2
         corridor_width: Width of corridor (distance between walls)
         wall_height: Height of walls
         point_density: Spacing between wall points
+        cache_dir: Directory for caching the static outer walls and ground
+            plane, which only depend on the bounds and density (optional)
 
     Returns:
         Mx3 array of wall points
@@ -109,6 +141,12 @@ def create_environment_walls(route_center: np.ndarray, corridor_width: float = 2
     x_min, y_min = route_center.min(axis=0) - corridor_width
     x_max, y_max = route_center.max(axis=0) + corridor_width
 
+    # Axis arrays shared by the segment, outer-wall, ground, pillar and corner passes
+    xs = np.arange(x_min, x_max, point_density)
+    ys = np.arange(y_min, y_max, point_density)
+    zs = np.arange(0, wall_height, point_density)
+    xs_coarse, ys_coarse, zs_coarse = xs[::2], ys[::2], zs[::2]
+
     # Create INNER corridor walls (closer to the route for better ICP)
     inner_offset = 0.8  # Distance from route center to inner walls
 
@@ -125,7 +163,7 @@ def create_environment_walls(route_center: np.ndarray, corridor_width: float = 2
         # Create wall points along this segment (both sides)
         for t in np.arange(0, length, point_density):
             point = p1 + t * direction
-            for z in np.arange(0, wall_height, point_density):
+            for z in zs:
                 # Left wall
                 wall_points.append([point[0] + normal[0] * inner_offset,
                                    point[1] + normal[1] * inner_offset, z])
@@ -134,33 +172,42 @@ def create_environment_walls(route_center: np.ndarray, corridor_width: float = 2
                                    point[1] - normal[1] * inner_offset, z])
 
     # Create outer boundary walls (for global reference)
-    for x in np.arange(x_min, x_max, point_density * 2):
-        for z in np.arange(0, wall_height, point_density * 2):
-            wall_points.append([x, y_min - half_width, z])
-            wall_points.append([x, y_max + half_width, z])
-
-    for y in np.arange(y_min, y_max, point_density * 2):
-        for z in np.arange(0, wall_height, point_density * 2):
-            wall_points.append([x_min - half_width, y, z])
-            wall_points.append([x_max + half_width, y, z])
+    def build_outer_walls():
+        wx, wz = [a.ravel() for a in np.meshgrid(xs_coarse, zs_coarse, indexing='ij')]
+        wy, wyz = [a.ravel() for a in np.meshgrid(ys_coarse, zs_coarse, indexing='ij')]
+        return np.vstack([
+            np.column_stack([wx, np.full_like(wx, y_min - half_width), wz]),
+            np.column_stack([wx, np.full_like(wx, y_max + half_width), wz]),
+            np.column_stack([np.full_like(wy, x_min - half_width), wy, wyz]),
+            np.column_stack([np.full_like(wy, x_max + half_width), wy, wyz]),
+        ])
+
+    bounds_key = f"{x_min}_{x_max}_{y_min}_{y_max}_{point_density}"
+    outer_walls = load_or_build_points(
+        cache_dir, 'outer_walls', f"{bounds_key}_{wall_height}_{half_width}",
+        build_outer_walls)
 
     # Dense ground plane with distinctive grid pattern
-    for x in np.arange(x_min, x_max, point_density):
-        for y in np.arange(y_min, y_max, point_density):
-            wall_points.append([x, y, 0.0])
+    def build_ground():
+        gx, gy = [a.ravel() for a in np.meshgrid(xs, ys, indexing='ij')]
+        return np.column_stack([gx, gy, np.zeros_like(gx)])
+
+    ground = load_or_build_points(cache_dir, 'ground', bounds_key, build_ground)
 
     # Add pillars at ALL waypoints (not just corners) for distinctive features
-    for i, wp in enumerate(route_center):
-        pillar_radius = 0.15
-        for angle in np.arange(0, 2*np.pi, 0.15):
-            for z in np.arange(0, wall_height, point_density):
-                # Offset pillar to the side so it doesn't block the path
-                offset = 0.5 if i % 2 == 0 else -0.5
-                wall_points.append([
-                    wp[0] + offset + pillar_radius * np.cos(angle),
-                    wp[1] + pillar_radius * np.sin(angle),
-                    z
-                ])
+    # A single canonical pillar (ring x heights) is translated to each waypoint
+    pillar_radius = 0.15
+    angles = np.arange(0, 2*np.pi, 0.15)
+    ring_x, pillar_z = np.meshgrid(pillar_radius * np.cos(angles), zs, indexing='ij')
+    ring_y, _ = np.meshgrid(pillar_radius * np.sin(angles), zs, indexing='ij')
+    canonical_pillar = np.column_stack([ring_x.ravel(), ring_y.ravel(), pillar_z.ravel()])
+
+    # Offset pillar to the side so it doesn't block the path
+    pillar_offsets = np.zeros((len(route_center), 3))
+    pillar_offsets[:, 0] = route_center[:, 0] + np.where(
+        np.arange(len(route_center)) % 2 == 0, 0.5, -0.5)
+    pillar_offsets[:, 1] = route_center[:, 1]
+    pillars = (canonical_pillar[None, :, :] + pillar_offsets[:, None, :]).reshape(-1, 3)
 
     # Add large corner structures for very distinctive features at corners
     corner_positions = [
@@ -171,14 +218,16 @@ def create_environment_walls(route_center: np.ndarray, corridor_width: float = 2
         (route_center[-1], 'end'),
     ]
 
+    corner_dxs = np.arange(-0.5, 0.5, point_density)
+    corner_zs = np.arange(0, wall_height * 1.5, point_density)
     for corner, name in corner_positions:
         # Large L-shaped structure at corners
-        for dx in np.arange(-0.5, 0.5, point_density):
-            for z in np.arange(0, wall_height * 1.5, point_density):
+        for dx in corner_dxs:
+            for z in corner_zs:
                 wall_points.append([corner[0] + dx + 1.0, corner[1], z])
                 wall_points.append([corner[0], corner[1] + dx + 1.0, z])
 
-    return np.array(wall_points)
+    return np.vstack([np.array(wall_points).reshape(-1, 3), outer_walls, ground, pillars])
 
 
 def simulate_lidar_scan(sensor_pos: np.ndarray, sensor_heading: float,
@@ -262,6 +311,8 @@ def main():
                         help='Maximum number of frames to generate')
     parser.add_argument('--visualize', '-v', action='store_true',
                         help='Visualize the environment and trajectory')
+    parser.add_argument('--cache-dir', default='data/.env_cache',
+                        help='Cache directory for static environment geometry')
 
     args = parser.parse_args()
 
@@ -289,7 +340,7 @@ def main():
 
     # Create environment
     print("\n[3/4] Creating environment (walls, ground, pillars)...")
-    environment = create_environment_walls(positions)
+    environment = create_environment_walls(positions, cache_dir=args.cache_dir)
     print(f"      Environment has {len(environment)} points")
 
     # Generate PCD sequence
@@ -59,6 +59,19 @@ def create_coordinate_frame(size: float = 1.0) -> o3d.geometry.TriangleMesh:
     return o3d.geometry.TriangleMesh.create_coordinate_frame(size=size)
 
 
+def voxel_down_sample(pcd: o3d.geometry.PointCloud, voxel_size: float) -> o3d.geometry.PointCloud:
+    """Voxel downsample, using the Open3D tensor API on CUDA when available."""
+    try:
+        if o3d.core.cuda.is_available():
+            pcd_t = o3d.t.geometry.PointCloud.from_legacy(pcd).cuda(0)
+            pcd_t = pcd_t.voxel_down_sample(voxel_size)
+            return pcd_t.cpu().to_legacy()
+    except Exception as e:
+        print(f"  CUDA downsampling failed ({e}), falling back to CPU")
+
+    return pcd.voxel_down_sample(voxel_size)
+
+
 def color_by_height(pcd: o3d.geometry.PointCloud) -> o3d.geometry.PointCloud:
     """Color point cloud by height (Z coordinate)."""
     points = np.asarray(pcd.points)
@@ -111,7 +124,7 @@ def main():
 
     # Optional downsampling
     if args.voxel_size > 0:
-        pcd = pcd.voxel_down_sample(args.voxel_size)
+        pcd = voxel_down_sample(pcd, args.voxel_size)
         print(f"  After downsampling: {len(pcd.points)} points")
 
     # Color by height
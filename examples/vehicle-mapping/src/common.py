@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the mapping pipeline modules and DORA operators.
+
+The operators add the example root to sys.path and import from
+``src.common``; library modules use a relative import.
+"""
+
+import functools
+import os
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_yaml(path_str: str, mtime: float) -> dict:
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path_str) as f:
+        return yaml.load(f, Loader=loader) or {}
+
+
+def load_yaml(path) -> dict:
+    """Parse a YAML file; cached until its modification time changes."""
+    path_str = str(path)
+    return _parse_yaml(path_str, os.path.getmtime(path_str))
+
+
+def voxel_downsample_np(points: np.ndarray, voxel: float, representative: bool = False) -> np.ndarray:
+    """
+    Voxel grid filter returning the centroid of each occupied voxel.
+
+    With representative=True the first point in each voxel is kept
+    instead, which skips the centroid reduction.
+    """
+    keys = np.floor(points * (1.0 / voxel)).astype(np.int64)
+    keys -= keys.min(axis=0)
+    dims = keys.max(axis=0) + 1
+
+    # Collision-free linear voxel index
+    flat = (keys[:, 0] * dims[1] + keys[:, 1]) * dims[2] + keys[:, 2]
+    if representative:
+        _, idx = np.unique(flat, return_index=True)
+        return points[idx]
+    _, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+
+    n_voxels = len(counts)
+    centroids = np.empty((n_voxels, 3), dtype=points.dtype)
+    for axis in range(3):
+        centroids[:, axis] = np.bincount(inverse, weights=points[:, axis], minlength=n_voxels) / counts
+    return centroids
+
+
+def float32_array(buf: np.ndarray):
+    """Wrap a contiguous float32 buffer as an Arrow array without copying."""
+    import pyarrow as pa
+    return pa.Array.from_buffers(pa.float32(), len(buf), [None, pa.py_buffer(buf)])
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _transform_kernel(points, R, t, out):
+        """Rigid transform of (N, 3) points into a preallocated output."""
+        for i in prange(points.shape[0]):
+            x = points[i, 0]
+            y = points[i, 1]
+            z = points[i, 2]
+            out[i, 0] = R[0, 0] * x + R[0, 1] * y + R[0, 2] * z + t[0]
+            out[i, 1] = R[1, 0] * x + R[1, 1] * y + R[1, 2] * z + t[1]
+            out[i, 2] = R[2, 0] * x + R[2, 1] * y + R[2, 2] * z + t[2]
+
+
+def transform_points(points: np.ndarray, pose: np.ndarray) -> np.ndarray:
+    """Transform float32 (N, 3) points by a 4x4 pose."""
+    pose = pose.astype(np.float32, copy=False)
+    if NUMBA_AVAILABLE:
+        out = np.empty_like(points)
+        _transform_kernel(points, np.ascontiguousarray(pose[:3, :3]), np.ascontiguousarray(pose[:3, 3]), out)
+        return out
+    return points @ pose[:3, :3].T + pose[:3, 3]
@@ -80,23 +80,24 @@ class KissICPRunner:
         config = self._create_kiss_config()
         kiss_icp = KissICP(config)
 
-        poses = []
-        for i, points in enumerate(point_clouds):
-            # Ensure points are float64
-            points = points.astype(np.float64)
+        poses = np.empty((len(point_clouds), 4, 4), dtype=np.float64)
+
+        # Dummy timestamps (required by KISS-ICP preprocessor), sized for the
+        # largest frame and sliced per frame.
+        # Timestamps are used for motion compensation in spinning LiDARs
+        timestamps = np.zeros(max((len(p) for p in point_clouds), default=0), dtype=np.float64)
 
-            # Create dummy timestamps (required by KISS-ICP preprocessor)
-            # Timestamps are used for motion compensation in spinning LiDARs
-            timestamps = np.zeros(len(points), dtype=np.float64)
+        for i, points in enumerate(point_clouds):
+            # Ensure points are contiguous float64 (no copy if already)
+            points = np.ascontiguousarray(points, dtype=np.float64)
 
             # Register frame
-            kiss_icp.register_frame(points, timestamps=timestamps)
+            kiss_icp.register_frame(points, timestamps=timestamps[:len(points)])
 
             # Get current pose
-            pose = kiss_icp.poses[-1]
-            poses.append(pose)
+            poses[i] = kiss_icp.poses[-1]
 
-        return np.array(poses)
+        return poses
 
     def run_cli(self, data_dir: str, output_dir: str = None,
                 visualize: bool = False) -> Path:
@@ -150,12 +151,10 @@ class KissICPRunner:
             poses = np.load(str(poses_file))
         elif poses_file.suffix == '.txt':
             # KITTI format: 12 values per line (3x4 matrix flattened)
-            data = np.loadtxt(str(poses_file))
-            n_poses = len(data)
-            poses = np.zeros((n_poses, 4, 4))
-            for i, row in enumerate(data):
-                poses[i, :3, :4] = row.reshape(3, 4)
-                poses[i, 3, 3] = 1.0
+            data = np.loadtxt(str(poses_file), ndmin=2)
+            poses = np.zeros((len(data), 4, 4))
+            poses[:, :3, :4] = data.reshape(-1, 3, 4)
+            poses[:, 3, 3] = 1.0
         else:
             raise ValueError(f"Unknown pose file format: {poses_file.suffix}")
 
@@ -190,11 +189,9 @@ class KissICPRunner:
         if format == 'numpy':
             np.save(str(output_path.with_suffix('.npy')), poses)
         elif format == 'kitti':
-            with open(output_path.with_suffix('.txt'), 'w') as f:
-                for pose in poses:
-                    # KITTI format: 12 values (3x4 matrix flattened)
-                    row = pose[:3, :4].flatten()
-                    f.write(' '.join(f'{v:.6e}' for v in row) + '\n')
+            # KITTI format: 12 values (3x4 matrix flattened)
+            rows = np.asarray(poses)[:, :3, :4].reshape(-1, 12)
+            np.savetxt(str(output_path.with_suffix('.txt')), rows, fmt='%.6e')
         else:
             raise ValueError(f"Unknown format: {format}")
 
@@ -6,14 +6,127 @@ Loop closure detection finds when the robot revisits a previously
 visited location, allowing the pose graph to be corrected.
 """
 
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional
 import numpy as np
 
 try:
     import open3d as o3d
     OPEN3D_AVAILABLE = True
+    CUDA_AVAILABLE = o3d.core.cuda.is_available()
 except ImportError:
     OPEN3D_AVAILABLE = False
+    CUDA_AVAILABLE = False
+
+try:
+    from scipy import fft as scipy_fft
+    from scipy.spatial import cKDTree
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+try:
+    from numba import get_num_threads, njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _scan_context_kernel(points, num_rings, num_sectors, max_range, n_chunks):
+        """
+        Scan Context descriptor (max height per ring/sector bin).
+
+        Points are split into n_chunks chunks (one per thread), each filling
+        its own descriptor, which are then merged with a max reduction.
+        """
+        inv_range = num_rings / max_range
+        inv_angle = num_sectors / (2 * math.pi)
+        max_range_sq = max_range * max_range
+
+        n_points = points.shape[0]
+        chunk = (n_points + n_chunks - 1) // n_chunks
+        local = np.zeros((n_chunks, num_rings, num_sectors), dtype=np.float32)
+
+        for k in prange(n_chunks):
+            for i in range(k * chunk, min(n_points, (k + 1) * chunk)):
+                z = points[i, 2]
+                if z <= 0.0:
+                    continue
+                x = points[i, 0]
+                y = points[i, 1]
+                r2 = x * x + y * y
+                if r2 >= max_range_sq:
+                    continue
+                r = min(max(int(math.sqrt(r2) * inv_range), 0), num_rings - 1)
+                a = min(max(int((math.atan2(y, x) + math.pi) * inv_angle), 0), num_sectors - 1)
+                if z > local[k, r, a]:
+                    local[k, r, a] = z
+
+        descriptor = local[0].copy()
+        for k in range(1, n_chunks):
+            for r in range(num_rings):
+                for a in range(num_sectors):
+                    if local[k, r, a] > descriptor[r, a]:
+                        descriptor[r, a] = local[k, r, a]
+        return descriptor
+
+
+def se3_inverse(poses: np.ndarray) -> np.ndarray:
+    """
+    Invert rigid transforms in closed form (R^T, -R^T t).
+
+    Args:
+        poses: 4x4 or Nx4x4 transformation matrices
+
+    Returns:
+        Inverse transform(s) with the same shape
+    """
+    R_inv = np.swapaxes(poses[..., :3, :3], -1, -2)
+    t = poses[..., :3, 3]
+
+    inv = np.zeros_like(poses)
+    inv[..., :3, :3] = R_inv
+    inv[..., :3, 3] = -np.einsum('...ij,...j->...i', R_inv, t)
+    inv[..., 3, 3] = 1.0
+    return inv
+
+
+def world_aabb(points: np.ndarray, pose: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Axis-aligned bounding box of a local point cloud after transforming by pose.
+
+    Args:
+        points: Nx3 point cloud in local frame
+        pose: 4x4 transformation matrix (local to global)
+
+    Returns:
+        (min_bound, max_bound) in the global frame, or None for empty clouds
+    """
+    if len(points) == 0:
+        return None
+
+    lo, hi = points[:, :3].min(axis=0), points[:, :3].max(axis=0)
+    corners = np.stack(np.meshgrid(*zip(lo, hi), indexing='ij'), axis=-1).reshape(-1, 3)
+    corners = corners @ pose[:3, :3].T + pose[:3, 3]
+    return corners.min(axis=0), corners.max(axis=0)
+
+
+def aabb_overlap_ratio(box_a, box_b) -> float:
+    """Intersection volume of two AABBs relative to the smaller box volume."""
+    if box_a is None or box_b is None:
+        return 0.0
+
+    extent = np.minimum(box_a[1], box_b[1]) - np.maximum(box_a[0], box_b[0])
+    intersection = np.prod(np.clip(extent, 0, None))
+    min_volume = min(np.prod(box_a[1] - box_a[0]), np.prod(box_b[1] - box_b[0]))
+    if min_volume <= 0:
+        # Degenerate (flat) boxes cannot be judged by volume, keep the pair
+        return 1.0
+    return float(intersection / min_volume)
 
 
 class LoopDetector:
@@ -29,6 +142,11 @@ class LoopDetector:
                 - min_frame_gap: Minimum frames between loop candidates (default: 50)
                 - icp_fitness_threshold: ICP fitness for verification (default: 0.3)
                 - icp_max_correspondence: ICP correspondence distance (default: 0.5)
+                - n_workers: Threads for parallel ICP verification (default: CPU count)
+                - gpu_min_points: Run ICP on CUDA for clouds at least this large
+                  (default: 100000, 0 disables)
+                - min_overlap_ratio: Skip ICP for pairs whose world-frame bounding
+                  boxes overlap less than this fraction (default: 0.25, 0 disables)
         """
         config = config or {}
 
@@ -36,6 +154,9 @@ class LoopDetector:
         self.min_frame_gap = config.get('min_frame_gap', 50)
         self.icp_fitness_threshold = config.get('icp_fitness_threshold', 0.3)
         self.icp_max_correspondence = config.get('icp_max_correspondence', 0.5)
+        self.n_workers = config.get('n_workers', os.cpu_count() or 1)
+        self.gpu_min_points = config.get('gpu_min_points', 100000)
+        self.min_overlap_ratio = config.get('min_overlap_ratio', 0.25)
 
     def detect_candidates(self, poses: Dict[int, np.ndarray]) -> List[Tuple[int, int]]:
         """
@@ -47,24 +168,48 @@ class LoopDetector:
         Returns:
             List of (id_from, id_to) tuples representing loop candidates
         """
-        candidates = []
         pose_ids = sorted(poses.keys())
+        if not pose_ids:
+            return []
 
-        # Extract positions
-        positions = {k: poses[k][:3, 3] for k in pose_ids}
-
-        for i, id_i in enumerate(pose_ids):
-            for j, id_j in enumerate(pose_ids):
-                # Skip if not enough frame gap
-                if id_j - id_i < self.min_frame_gap:
-                    continue
-
-                # Check distance
-                dist = np.linalg.norm(positions[id_i] - positions[id_j])
-                if dist < self.distance_threshold:
-                    candidates.append((id_i, id_j))
-
-        return candidates
+        # Stack positions once as an Nx3 array
+        ids = np.array(pose_ids)
+        positions = np.stack([poses[k] for k in pose_ids])[:, :3, 3]
+
+        if SCIPY_AVAILABLE and len(pose_ids) > 1:
+            # Radius query over a KD-tree instead of checking every pair
+            tree = cKDTree(positions)
+            pairs = tree.query_pairs(r=self.distance_threshold, output_type='ndarray')
+            if len(pairs) == 0:
+                return []
+
+            # query_pairs returns i < j; keep the original strict distance test
+            dists = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+            mask = ((ids[pairs[:, 1]] - ids[pairs[:, 0]] >= self.min_frame_gap) &
+                    (dists < self.distance_threshold))
+            pairs = pairs[mask]
+            pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+            return [(int(ids[i]), int(ids[j])) for i, j in pairs]
+
+        # Without SciPy, compare all pairs by broadcasting in tiles small
+        # enough for the distance block to stay cache resident
+        block = 1024
+        n_poses = len(pose_ids)
+        threshold_sq = self.distance_threshold ** 2
+        pairs = []
+
+        for a in range(0, n_poses, block):
+            # With sorted ids and a positive gap, only j > i can qualify
+            b_start = a if self.min_frame_gap > 0 else 0
+            for b in range(b_start, n_poses, block):
+                diff = positions[a:a + block, None, :] - positions[None, b:b + block, :]
+                dist_sq = np.einsum('ijk,ijk->ij', diff, diff)
+                gap = ids[None, b:b + block] - ids[a:a + block, None]
+                ii, jj = np.nonzero((dist_sq < threshold_sq) & (gap >= self.min_frame_gap))
+                pairs.extend(zip((ii + a).tolist(), (jj + b).tolist()))
+
+        pairs.sort()
+        return [(int(ids[i]), int(ids[j])) for i, j in pairs]
 
     def verify_loop(self, cloud_i: np.ndarray, cloud_j: np.ndarray,
                     initial_guess: np.ndarray = None) -> Tuple[bool, Optional[np.ndarray], float]:
@@ -85,19 +230,29 @@ class LoopDetector:
         if initial_guess is None:
             initial_guess = np.eye(4)
 
-        # Create Open3D point clouds
-        pcd_i = o3d.geometry.PointCloud()
-        pcd_i.points = o3d.utility.Vector3dVector(cloud_i.astype(np.float64))
-
-        pcd_j = o3d.geometry.PointCloud()
-        pcd_j.points = o3d.utility.Vector3dVector(cloud_j.astype(np.float64))
-
-        # Downsample for faster ICP
-        voxel_size = 0.2
-        pcd_i_down = pcd_i.voxel_down_sample(voxel_size)
-        pcd_j_down = pcd_j.voxel_down_sample(voxel_size)
-
-        # Run ICP
+        # Large scans amortize the host-to-device copy, so run those on the GPU
+        if self._use_cuda(cloud_i, cloud_j):
+            return self._verify_loop_cuda(cloud_i, cloud_j, initial_guess)
+
+        return self._register(self._downsample(cloud_i), self._downsample(cloud_j),
+                              initial_guess)
+
+    def _use_cuda(self, cloud_i: np.ndarray, cloud_j: np.ndarray) -> bool:
+        """Whether a pair is large enough to verify on the GPU."""
+        return (CUDA_AVAILABLE and self.gpu_min_points > 0 and
+                min(len(cloud_i), len(cloud_j)) >= self.gpu_min_points)
+
+    @staticmethod
+    def _downsample(cloud: np.ndarray, voxel_size: float = 0.2) -> 'o3d.geometry.PointCloud':
+        """Create an Open3D point cloud downsampled for faster ICP."""
+        pcd = o3d.geometry.PointCloud()
+        pcd.points = o3d.utility.Vector3dVector(cloud.astype(np.float64))
+        return pcd.voxel_down_sample(voxel_size)
+
+    def _register(self, pcd_i_down: 'o3d.geometry.PointCloud',
+                  pcd_j_down: 'o3d.geometry.PointCloud',
+                  initial_guess: np.ndarray) -> Tuple[bool, Optional[np.ndarray], float]:
+        """Run point-to-point ICP on already downsampled clouds."""
         result = o3d.pipelines.registration.registration_icp(
             pcd_i_down, pcd_j_down,
             self.icp_max_correspondence,
@@ -109,6 +264,31 @@ class LoopDetector:
         success = result.fitness > self.icp_fitness_threshold
         return success, result.transformation, result.fitness
 
+    def _verify_loop_cuda(self, cloud_i: np.ndarray, cloud_j: np.ndarray,
+                          initial_guess: np.ndarray) -> Tuple[bool, Optional[np.ndarray], float]:
+        """Verify loop closure with Open3D tensor ICP on CUDA."""
+        device = o3d.core.Device("CUDA:0")
+
+        voxel_size = 0.2
+        pcd_i = o3d.t.geometry.PointCloud(
+            o3d.core.Tensor(cloud_i, dtype=o3d.core.float32, device=device)
+        ).voxel_down_sample(voxel_size)
+        pcd_j = o3d.t.geometry.PointCloud(
+            o3d.core.Tensor(cloud_j, dtype=o3d.core.float32, device=device)
+        ).voxel_down_sample(voxel_size)
+
+        result = o3d.t.pipelines.registration.icp(
+            pcd_i, pcd_j,
+            self.icp_max_correspondence,
+            init_source_to_target=o3d.core.Tensor(initial_guess),
+            estimation_method=o3d.t.pipelines.registration.TransformationEstimationPointToPoint(),
+            criteria=o3d.t.pipelines.registration.ICPConvergenceCriteria(max_iteration=50)
+        )
+
+        transformation = result.transformation.cpu().numpy()
+        success = result.fitness > self.icp_fitness_threshold
+        return success, transformation, result.fitness
+
     def detect_and_verify(self, poses: Dict[int, np.ndarray],
                           point_clouds: Dict[int, np.ndarray]) -> List[Tuple[int, int, np.ndarray]]:
         """
@@ -126,19 +306,53 @@ class LoopDetector:
 
         print(f"[LoopDetector] Found {len(candidates)} loop candidates")
 
-        for id_i, id_j in candidates:
-            if id_i not in point_clouds or id_j not in point_clouds:
-                continue
+        if not candidates:
+            print("[LoopDetector] Verified 0 loop closures")
+            return verified_loops
+
+        candidates = [(id_i, id_j) for id_i, id_j in candidates
+                      if id_i in point_clouds and id_j in point_clouds]
+
+        # Reject pairs whose clouds barely overlap before paying for ICP
+        if self.min_overlap_ratio > 0 and candidates:
+            frame_ids = {frame_id for candidate in candidates for frame_id in candidate}
+            boxes = {frame_id: world_aabb(point_clouds[frame_id], poses[frame_id])
+                     for frame_id in frame_ids}
+            n_before = len(candidates)
+            candidates = [(id_i, id_j) for id_i, id_j in candidates
+                          if aabb_overlap_ratio(boxes[id_i], boxes[id_j]) >= self.min_overlap_ratio]
+            print(f"[LoopDetector] Overlap prefilter kept {len(candidates)}/{n_before} candidates")
+
+        # A frame usually appears in many candidate pairs, so downsample each
+        # CPU-verified frame once up front
+        cpu_ids = sorted({frame_id for id_i, id_j in candidates
+                          if not self._use_cuda(point_clouds[id_i], point_clouds[id_j])
+                          for frame_id in (id_i, id_j)})
+
+        # Each source frame pairs with many targets, so invert each unique
+        # source pose once, batched and in closed form
+        source_ids = sorted({id_i for id_i, _ in candidates})
+        inv_poses = {}
+        if source_ids:
+            inv_poses = dict(zip(source_ids, se3_inverse(np.stack([poses[i] for i in source_ids]))))
+
+        def verify_one(candidate):
+            id_i, id_j = candidate
 
             # Initial guess from current poses
-            initial_guess = np.linalg.inv(poses[id_i]) @ poses[id_j]
+            initial_guess = inv_poses[id_i] @ poses[id_j]
+
+            if id_i in downsampled and id_j in downsampled:
+                return self._register(downsampled[id_i], downsampled[id_j], initial_guess)
+            return self.verify_loop(point_clouds[id_i], point_clouds[id_j], initial_guess)
 
-            success, transform, fitness = self.verify_loop(
-                point_clouds[id_i],
-                point_clouds[id_j],
-                initial_guess
-            )
+        # Open3D releases the GIL during ICP, so threads verify candidates in parallel
+        with ThreadPoolExecutor(max_workers=max(1, self.n_workers)) as executor:
+            downsampled = dict(zip(cpu_ids, executor.map(
+                lambda frame_id: self._downsample(point_clouds[frame_id]), cpu_ids)))
+            results = list(executor.map(verify_one, candidates))
 
+        for (id_i, id_j), (success, transform, fitness) in zip(candidates, results):
             if success:
                 verified_loops.append((id_i, id_j, transform))
                 print(f"[LoopDetector] Verified loop: {id_i} -> {id_j} (fitness: {fitness:.3f})")
@@ -175,8 +389,22 @@ class ScanContextDetector:
         self.max_range = config.get('max_range', 80.0)
         self.similarity_threshold = config.get('similarity_threshold', 0.1)
 
+        # Scale factors from metric range / angle to grid indices
+        self._inv_range = self.num_rings / self.max_range
+        self._inv_angle = self.num_sectors / (2 * np.pi)
+
+        # Compiled descriptor kernel, shared by every detector and cached on disk
+        self._use_kernel = NUMBA_AVAILABLE
+
         self.descriptors = {}
 
+        # Conjugated sector-axis spectra, norms and frame ids for FFT
+        # matching, one row per frame in contiguous buffers grown by doubling
+        self._conj_spectra = np.empty((0, self.num_rings, self.num_sectors // 2 + 1), dtype=np.complex64)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._frame_ids = np.empty(0, dtype=np.int64)
+        self._rows = {}  # frame_id -> buffer row
+
     def compute_descriptor(self, points: np.ndarray) -> np.ndarray:
         """
         Compute Scan Context descriptor for a point cloud.
@@ -185,34 +413,60 @@ class ScanContextDetector:
             points: Nx3 point cloud
 
         Returns:
-            num_rings x num_sectors descriptor matrix
+            num_rings x num_sectors float32 descriptor matrix
         """
-        # Convert to polar coordinates
+        if self._use_kernel:
+            return _scan_context_kernel(np.ascontiguousarray(points[:, :3]), self.num_rings,
+                                        self.num_sectors, float(self.max_range), get_num_threads())
+
+        # Drop points beyond max_range (and at or below the ground, which can
+        # never raise a zero-initialized bin) before the costly polar conversion
         x, y, z = points[:, 0], points[:, 1], points[:, 2]
-        ranges = np.sqrt(x**2 + y**2)
+        r2 = x * x + y * y
+        keep = (r2 < self.max_range ** 2) & (z > 0)
+        x, y, z, r2 = x[keep], y[keep], z[keep], r2[keep]
+
+        # Convert to polar coordinates
+        ranges = np.sqrt(r2)
         angles = np.arctan2(y, x)  # -pi to pi
 
         # Normalize to grid indices
         range_idx = np.clip(
-            (ranges / self.max_range * self.num_rings).astype(int),
+            (ranges * self._inv_range).astype(int),
             0, self.num_rings - 1
         )
         angle_idx = np.clip(
-            ((angles + np.pi) / (2 * np.pi) * self.num_sectors).astype(int),
+            ((angles + np.pi) * self._inv_angle).astype(int),
             0, self.num_sectors - 1
         )
 
         # Build descriptor (max height in each bin)
-        descriptor = np.zeros((self.num_rings, self.num_sectors))
-        for i in range(len(points)):
-            r, a = range_idx[i], angle_idx[i]
-            descriptor[r, a] = max(descriptor[r, a], z[i])
+        # Heights do not need float64; float32 halves memory traffic in matching
+        descriptor = np.zeros((self.num_rings, self.num_sectors), dtype=np.float32)
+        flat_idx = range_idx * self.num_sectors + angle_idx
+        np.maximum.at(descriptor.ravel(), flat_idx, z.astype(np.float32))
 
         return descriptor
 
     def add_frame(self, frame_id: int, points: np.ndarray):
         """Add frame to database."""
-        self.descriptors[frame_id] = self.compute_descriptor(points)
+        descriptor = self.compute_descriptor(points)
+        self.descriptors[frame_id] = descriptor
+
+        row = self._rows.get(frame_id)
+        if row is None:
+            row = len(self._rows)
+            if row == len(self._frame_ids):
+                cap = max(2 * row, 64)
+                self._conj_spectra = np.resize(self._conj_spectra, (cap,) + self._conj_spectra.shape[1:])
+                self._norms = np.resize(self._norms, cap)
+                self._frame_ids = np.resize(self._frame_ids, cap)
+            self._rows[frame_id] = row
+
+        # complex64 keeps matching in single precision (NumPy < 2 upcasts rfft)
+        self._conj_spectra[row] = np.conj(np.fft.rfft(descriptor, axis=1))
+        self._norms[row] = np.linalg.norm(descriptor)
+        self._frame_ids[row] = frame_id
 
     def find_matches(self, query_id: int, min_gap: int = 50) -> List[Tuple[int, float]]:
         """
@@ -228,30 +482,34 @@ class ScanContextDetector:
         if query_id not in self.descriptors:
             return []
 
-        query_desc = self.descriptors[query_id]
-        matches = []
-
-        for frame_id, desc in self.descriptors.items():
-            if abs(frame_id - query_id) < min_gap:
-                continue
+        n = len(self._rows)
+        frame_ids = self._frame_ids[:n]
+        candidates = np.abs(frame_ids - query_id) >= min_gap
+        if not np.any(candidates):
+            return []
 
-            # Compute similarity (using correlation)
-            similarity = self._compute_similarity(query_desc, desc)
-            if similarity > self.similarity_threshold:
-                matches.append((frame_id, similarity))
+        # Circular cross-correlation along the sector axis gives the dot
+        # product for every column shift at once; summing over rings and
+        # taking the max over shifts matches the brute-force search. The
+        # whole buffer is correlated in place of gathering candidate rows.
+        q = self._rows[query_id]
+        query_spectrum = np.conj(self._conj_spectra[q])
+        cross = self._conj_spectra[:n] * query_spectrum[None]
+        if SCIPY_AVAILABLE:
+            # The inverse transforms are independent per frame and ring;
+            # pocketfft splits the batch across all cores
+            corr = scipy_fft.irfft(cross, n=self.num_sectors, axis=2, workers=-1)
+        else:
+            corr = np.fft.irfft(cross, n=self.num_sectors, axis=2)
+        corr = corr.sum(axis=1)
+
+        # Norms are rotation invariant, so normalize after the max
+        norms = self._norms[q] * self._norms[:n]
+        valid = candidates & (norms > 0)
+        similarities = np.zeros(n, dtype=np.float32)
+        similarities[valid] = np.maximum(corr.max(axis=1)[valid] / norms[valid], 0)
+
+        hits = np.flatnonzero(valid & (similarities > self.similarity_threshold))
+        matches = [(int(frame_ids[i]), float(similarities[i])) for i in hits]
 
         return sorted(matches, key=lambda x: -x[1])
-
-    def _compute_similarity(self, desc1: np.ndarray, desc2: np.ndarray) -> float:
-        """Compute similarity between two descriptors."""
-        # Try different column shifts to handle rotation
-        best_sim = 0
-        for shift in range(self.num_sectors):
-            shifted = np.roll(desc2, shift, axis=1)
-            # Cosine similarity
-            norm1 = np.linalg.norm(desc1)
-            norm2 = np.linalg.norm(shifted)
-            if norm1 > 0 and norm2 > 0:
-                sim = np.sum(desc1 * shifted) / (norm1 * norm2)
-                best_sim = max(best_sim, sim)
-        return best_sim
@@ -6,6 +6,10 @@ This module transforms individual point cloud frames into a global
 coordinate system and merges them into a single map.
 """
 
+import math
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
 import numpy as np
@@ -17,6 +21,77 @@ except ImportError:
     OPEN3D_AVAILABLE = False
     print("Warning: open3d not installed. Install with: pip install open3d")
 
+try:
+    from numba import njit, types
+    from numba.typed import Dict as NumbaDict
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    _VOXEL_KEY_TYPE = types.UniTuple(types.int64, 3)
+
+    @njit(cache=True, nogil=True, fastmath=True)
+    def _voxelize_transform(points, R, t, voxel_size):
+        """
+        Voxel downsample to centroids in the local frame, then transform.
+
+        Uses the same grid origin as Open3D's voxel_down_sample
+        (min bound minus half a voxel). Runs without the GIL.
+        """
+        n_points = points.shape[0]
+        if n_points == 0:
+            return np.empty((0, 3))
+
+        origin = np.empty(3)
+        for k in range(3):
+            origin[k] = points[:, k].min() - 0.5 * voxel_size
+
+        voxels = NumbaDict.empty(key_type=_VOXEL_KEY_TYPE, value_type=types.int64)
+        sums = np.zeros((n_points, 3))
+        counts = np.zeros(n_points, dtype=np.int64)
+        n_voxels = 0
+
+        for i in range(n_points):
+            key = (int(math.floor((points[i, 0] - origin[0]) / voxel_size)),
+                   int(math.floor((points[i, 1] - origin[1]) / voxel_size)),
+                   int(math.floor((points[i, 2] - origin[2]) / voxel_size)))
+            if key in voxels:
+                slot = voxels[key]
+            else:
+                slot = n_voxels
+                voxels[key] = slot
+                n_voxels += 1
+            for k in range(3):
+                sums[slot, k] += points[i, k]
+            counts[slot] += 1
+
+        result = np.empty((n_voxels, 3))
+        for v in range(n_voxels):
+            cx = sums[v, 0] / counts[v]
+            cy = sums[v, 1] / counts[v]
+            cz = sums[v, 2] / counts[v]
+            for k in range(3):
+                result[v, k] = R[k, 0] * cx + R[k, 1] * cy + R[k, 2] * cz + t[k]
+        return result
+
+    @njit(cache=True, nogil=True)
+    def _point_stats(points):
+        """Per-axis min, max and mean in a single pass over the points."""
+        mins = points[0].copy()
+        maxs = points[0].copy()
+        sums = np.zeros(3)
+        for i in range(points.shape[0]):
+            for k in range(3):
+                v = points[i, k]
+                if v < mins[k]:
+                    mins[k] = v
+                if v > maxs[k]:
+                    maxs[k] = v
+                sums[k] += v
+        return mins, maxs, sums / points.shape[0]
+
 
 class MapBuilder:
     """Build and fuse point cloud map from frames."""
@@ -32,6 +107,10 @@ class MapBuilder:
                 - remove_statistical_outliers: Remove outliers (default: True)
                 - nb_neighbors: Neighbors for outlier removal (default: 20)
                 - std_ratio: Std ratio for outlier removal (default: 2.0)
+                - compact_interval: Frames between in-memory compactions (default: 50)
+                - n_workers: Threads used by build_map (default: CPU count)
+                - tile_size: Edge length of spatial tiles for the final downsample (default: 50.0)
+                - tile_min_points: Tile the final downsample above this size (default: 5000000)
         """
         if not OPEN3D_AVAILABLE:
             raise ImportError("open3d not installed. Install with: pip install open3d")
@@ -43,6 +122,13 @@ class MapBuilder:
         self.remove_outliers = config.get('remove_statistical_outliers', True)
         self.nb_neighbors = config.get('nb_neighbors', 20)
         self.std_ratio = config.get('std_ratio', 2.0)
+        self.compact_interval = config.get('compact_interval', 50)
+        self.n_workers = config.get('n_workers', os.cpu_count() or 1)
+        self.tile_size = config.get('tile_size', 50.0)
+        self.tile_min_points = config.get('tile_min_points', 5000000)
+
+        # Transformed frames are buffered as NumPy chunks and merged once
+        self._chunks: List[np.ndarray] = []
 
         # Global map
         self.global_map = o3d.geometry.PointCloud()
@@ -58,19 +144,46 @@ class MapBuilder:
             pose: 4x4 transformation matrix (local to global)
             downsample: Whether to downsample before adding
         """
-        pcd = o3d.geometry.PointCloud()
-        pcd.points = o3d.utility.Vector3dVector(points.astype(np.float64))
+        self._append_chunk(self._transform_frame(points, pose, downsample))
+
+    def _append_chunk(self, chunk: np.ndarray):
+        """Buffer a transformed frame, compacting periodically."""
+        self._chunks.append(chunk)
+        self.n_frames_added += 1
+
+        # Periodically merge chunks to bound memory
+        if self.compact_interval > 0 and self.n_frames_added % self.compact_interval == 0:
+            self._compact()
+
+    def _transform_frame(self, points: np.ndarray, pose: np.ndarray,
+                         downsample: bool = True) -> np.ndarray:
+        """Downsample a frame and transform it to the global frame."""
+        R = np.ascontiguousarray(pose[:3, :3], dtype=np.float64)
+        t = np.ascontiguousarray(pose[:3, 3], dtype=np.float64)
+
+        # No copy when the frame is already contiguous float64
+        points = np.ascontiguousarray(points[:, :3], dtype=np.float64)
 
-        # Downsample frame
         if downsample and self.voxel_size > 0:
-            pcd = pcd.voxel_down_sample(self.voxel_size)
+            if NUMBA_AVAILABLE:
+                return _voxelize_transform(points, R, t, self.voxel_size)
 
-        # Transform to global frame
-        pcd.transform(pose)
+            pcd = o3d.geometry.PointCloud()
+            pcd.points = o3d.utility.Vector3dVector(points)
+            points = np.asarray(pcd.voxel_down_sample(self.voxel_size).points)
 
-        # Merge with global map
-        self.global_map += pcd
-        self.n_frames_added += 1
+        return points @ R.T + t
+
+    def _compact(self):
+        """Merge buffered chunks into a single voxel-downsampled chunk."""
+        if len(self._chunks) == 0:
+            return
+
+        pcd = o3d.geometry.PointCloud()
+        pcd.points = o3d.utility.Vector3dVector(np.concatenate(self._chunks))
+        if self.map_voxel_size > 0:
+            pcd = pcd.voxel_down_sample(self.map_voxel_size)
+        self._chunks = [np.array(pcd.points)]
 
     def build_map(self, point_clouds: List[np.ndarray],
                   poses: Dict[int, np.ndarray],
@@ -87,10 +200,28 @@ class MapBuilder:
             Merged and downsampled point cloud map
         """
         n_frames = len(point_clouds)
-
-        for i, cloud in enumerate(point_clouds):
-            if i in poses:
-                self.add_frame(cloud, poses[i])
+        frame_ids = [i for i in range(n_frames) if i in poses]
+
+        # Frames are independent and both the Numba kernel and Open3D release
+        # the GIL, so transform them on a thread pool. At most two frames per
+        # worker are in flight, so finished chunks never pile up ahead of the
+        # periodic compaction; results are consumed in frame order from this
+        # thread, so chunks are buffered without a lock.
+        n_workers = max(1, self.n_workers)
+        pending = deque()
+        next_frames = iter(frame_ids)
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            def submit_next():
+                i = next(next_frames, None)
+                if i is not None:
+                    pending.append((i, executor.submit(self._transform_frame, point_clouds[i], poses[i])))
+
+            for _ in range(2 * n_workers):
+                submit_next()
+            while pending:
+                i, future = pending.popleft()
+                self._append_chunk(future.result())
+                submit_next()
 
                 if progress_callback:
                     progress_callback(i + 1, n_frames)
@@ -102,9 +233,16 @@ class MapBuilder:
 
     def finalize_map(self):
         """Apply final processing to the map."""
+        # Merge buffered chunks in one go
+        if self._chunks:
+            merged = [np.asarray(self.global_map.points)] + self._chunks
+            self.global_map = o3d.geometry.PointCloud()
+            self.global_map.points = o3d.utility.Vector3dVector(np.concatenate(merged))
+            self._chunks = []
+
         # Voxel downsample
         if self.map_voxel_size > 0:
-            self.global_map = self.global_map.voxel_down_sample(self.map_voxel_size)
+            self.global_map = self._voxel_down_sample_tiled(self.global_map, self.map_voxel_size)
 
         # Remove statistical outliers
         if self.remove_outliers and len(self.global_map.points) > 0:
@@ -113,6 +251,45 @@ class MapBuilder:
                 std_ratio=self.std_ratio
             )
 
+    def _voxel_down_sample_tiled(self, pcd: o3d.geometry.PointCloud,
+                                 voxel_size: float) -> o3d.geometry.PointCloud:
+        """
+        Voxel downsample a large cloud one occupied spatial tile at a time.
+
+        Only occupied tiles are visited, so the voxel hash never has to hold
+        the whole map at once. Tile edges are multiples of the voxel size from
+        a shared origin, so the result matches a single global voxel grid.
+        """
+        points = np.asarray(pcd.points)
+        if len(points) <= self.tile_min_points or self.tile_size <= 0:
+            return pcd.voxel_down_sample(voxel_size)
+
+        origin = points.min(axis=0) - voxel_size * 0.5
+        tile = voxel_size * max(1, round(self.tile_size / voxel_size))
+        tile_idx = np.floor((points - origin) / tile).astype(np.int64)
+        keys = np.ravel_multi_index(tile_idx.T, tuple(tile_idx.max(axis=0) + 1))
+
+        # Group point indices by tile
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+
+        downsampled = []
+        for start, end in zip(starts, ends):
+            idx = order[start:end]
+            tile_min = origin + tile_idx[idx[0]] * tile
+
+            tile_pcd = o3d.geometry.PointCloud()
+            tile_pcd.points = o3d.utility.Vector3dVector(points[idx])
+            tile_down, _, _ = tile_pcd.voxel_down_sample_and_trace(
+                voxel_size, tile_min, tile_min + tile, False)
+            downsampled.append(np.asarray(tile_down.points))
+
+        result = o3d.geometry.PointCloud()
+        result.points = o3d.utility.Vector3dVector(np.concatenate(downsampled))
+        return result
+
     def estimate_normals(self, radius: float = 0.2, max_nn: int = 30):
         """
         Estimate normals for the map.
@@ -127,13 +304,15 @@ class MapBuilder:
             )
         )
 
-    def save_map(self, output_path: str, estimate_normals: bool = False):
+    def save_map(self, output_path: str, estimate_normals: bool = False,
+                 compressed: bool = True):
         """
         Save map to file.
 
         Args:
             output_path: Output file path (.ply, .pcd, .xyz, etc.)
             estimate_normals: Estimate normals before saving
+            compressed: Write binary (compressed for .pcd) via the tensor API
         """
         if estimate_normals and not self.global_map.has_normals():
             self.estimate_normals()
@@ -141,7 +320,17 @@ class MapBuilder:
         output_path = Path(output_path)
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        success = o3d.io.write_point_cloud(str(output_path), self.global_map)
+        if compressed:
+            # Tensor writer supports binary + compressed output, which cuts
+            # disk usage and I/O time considerably for large maps
+            success = o3d.t.io.write_point_cloud(
+                str(output_path),
+                o3d.t.geometry.PointCloud.from_legacy(self.global_map),
+                write_ascii=False,
+                compressed=True
+            )
+        else:
+            success = o3d.io.write_point_cloud(str(output_path), self.global_map)
         if success:
             print(f"[MapBuilder] Saved map to {output_path} ({len(self.global_map.points)} points)")
         else:
@@ -156,12 +345,18 @@ class MapBuilder:
         if len(points) == 0:
             return {'n_points': 0}
 
+        if NUMBA_AVAILABLE:
+            bounds_min, bounds_max, center = _point_stats(points)
+        else:
+            bounds_min, bounds_max = points.min(axis=0), points.max(axis=0)
+            center = points.mean(axis=0)
+
         return {
             'n_points': len(points),
             'n_frames': self.n_frames_added,
-            'bounds_min': points.min(axis=0).tolist(),
-            'bounds_max': points.max(axis=0).tolist(),
-            'center': points.mean(axis=0).tolist(),
+            'bounds_min': bounds_min.tolist(),
+            'bounds_max': bounds_max.tolist(),
+            'center': center.tolist(),
         }
 
     def visualize(self, window_name: str = "Map"):
@@ -175,10 +370,10 @@ class MapBuilder:
             # Color by height
             points = np.asarray(self.global_map.points)
             z = points[:, 2]
-            z_norm = (z - z.min()) / (z.max() - z.min() + 1e-6)
-            colors = np.zeros((len(points), 3))
-            colors[:, 0] = z_norm  # Red channel based on height
-            colors[:, 2] = 1 - z_norm  # Blue channel
+            z_min = z.min()
+            z_norm = (z - z_min) / (z.max() - z_min + 1e-6)
+            # Red channel rises with height, blue falls
+            colors = np.column_stack([z_norm, np.zeros_like(z_norm), 1 - z_norm])
             self.global_map.colors = o3d.utility.Vector3dVector(colors)
 
         o3d.visualization.draw_geometries(
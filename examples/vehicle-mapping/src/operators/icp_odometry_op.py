@@ -14,17 +14,231 @@ Outputs:
 """
 
 import os
+import sys
+from collections import deque
 from pathlib import Path
-from typing import List, Optional
+from typing import Deque, Optional
 import numpy as np
-import pyarrow as pa
 from dora import DoraStatus
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.common import float32_array, load_yaml, transform_points  # noqa: E402
+
 try:
     import open3d as o3d
     OPEN3D_AVAILABLE = True
+    CUDA_AVAILABLE = o3d.core.cuda.is_available()
 except ImportError:
     OPEN3D_AVAILABLE = False
+    CUDA_AVAILABLE = False
+
+try:
+    from scipy.optimize import least_squares
+    from scipy.spatial import cKDTree
+    from scipy.spatial.transform import Rotation
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+
+def _spread_bits(x: int) -> int:
+    """Insert two zero bits between each of the low 8 bits of x."""
+    out = 0
+    for bit in range(8):
+        out |= ((x >> bit) & 1) << (3 * bit)
+    return out
+
+
+_MORTON_LUT_256 = np.array([_spread_bits(i) for i in range(256)], dtype=np.uint64)
+
+
+def _morton_spread(x: np.ndarray) -> np.ndarray:
+    """Spread 21-bit unsigned integers for 3D Morton interleaving."""
+    x = x.astype(np.uint64)
+    return (_MORTON_LUT_256[x & 0xff]
+            | (_MORTON_LUT_256[(x >> 8) & 0xff] << np.uint64(24))
+            | (_MORTON_LUT_256[(x >> 16) & 0x1f] << np.uint64(48)))
+
+
+def _morton_order(points: np.ndarray, cell_size: float) -> np.ndarray:
+    """Permutation sorting points along a Z-order curve over cells of cell_size."""
+    ijk = np.floor(points / cell_size).astype(np.int64)
+    ijk -= ijk.min(axis=0)
+    np.minimum(ijk, (1 << 21) - 1, out=ijk)
+    codes = (_morton_spread(ijk[:, 0])
+             | (_morton_spread(ijk[:, 1]) << np.uint64(1))
+             | (_morton_spread(ijk[:, 2]) << np.uint64(2)))
+    return np.argsort(codes, kind='stable')
+
+
+def _build_ndt_grid(points: np.ndarray, resolution: float, min_points: int = 5) -> Optional[dict]:
+    """
+    Build an NDT grid (per-voxel Gaussian) over target points.
+
+    Returns:
+        Dict with sorted voxel keys, means, Cholesky factors of the precision
+        matrices and the key packing parameters, or None if no voxel is usable
+    """
+    points = points.astype(np.float64)
+    ijk = np.floor(points / resolution).astype(np.int64)
+    origin = ijk.min(axis=0) - 1
+    dims = ijk.max(axis=0) - origin + 2
+    keys = _pack_voxel_keys(ijk, origin, dims)
+    voxel_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+    n_voxels = len(voxel_keys)
+    sums = np.zeros((n_voxels, 3))
+    np.add.at(sums, inverse, points)
+    means = sums / counts[:, None]
+
+    centered = points - means[inverse]
+    outer = centered[:, :, None] * centered[:, None, :]
+    covs = np.zeros((n_voxels, 3, 3))
+    np.add.at(covs, inverse, outer)
+
+    valid = counts >= min_points
+    if not np.any(valid):
+        return None
+    covs = covs[valid] / (counts[valid, None, None] - 1)
+
+    # Regularize near-planar voxels so the precision stays bounded
+    covs += np.eye(3) * 1e-3 * resolution ** 2
+    precision = np.linalg.inv(covs)
+    chol = np.linalg.cholesky(precision).transpose(0, 2, 1)  # P = L^T L
+
+    return {
+        'keys': voxel_keys[valid], 'means': means[valid], 'chol': chol,
+        'origin': origin, 'dims': dims, 'resolution': resolution,
+    }
+
+
+def _pack_voxel_keys(ijk: np.ndarray, origin: np.ndarray, dims: np.ndarray) -> np.ndarray:
+    """Pack voxel indices into int64 keys; -1 for voxels outside the grid."""
+    rel = ijk - origin
+    inside = np.all((rel >= 0) & (rel < dims), axis=1)
+    keys = (rel[:, 0] * dims[1] + rel[:, 1]) * dims[2] + rel[:, 2]
+    return np.where(inside, keys, -1)
+
+
+def _ndt_lookup(points: np.ndarray, grid: dict) -> tuple:
+    """Return (point mask, voxel index) for points that fall in a valid NDT voxel."""
+    ijk = np.floor(points / grid['resolution']).astype(np.int64)
+    keys = _pack_voxel_keys(ijk, grid['origin'], grid['dims'])
+    idx = np.minimum(np.searchsorted(grid['keys'], keys), len(grid['keys']) - 1)
+    mask = (keys >= 0) & (grid['keys'][idx] == keys)
+    return mask, idx[mask]
+
+
+def _ndt_align(source: np.ndarray, grid: dict, max_iteration: int, max_correspondence: float) -> tuple:
+    """
+    Align source points to an NDT grid.
+
+    Minimizes the robust Mahalanobis distance of each point to the Gaussian of
+    the voxel it falls in, re-associating voxels at every evaluation.
+
+    Returns:
+        (4x4 transformation, fraction of points within max_correspondence of
+         their voxel mean, rmse over those inliers), matching ICP's
+         fitness and inlier_rmse
+    """
+    source = source.astype(np.float64)
+
+    def apply(x):
+        return source @ Rotation.from_rotvec(x[:3]).as_matrix().T + x[3:]
+
+    def residuals(x):
+        moved = apply(x)
+        mask, idx = _ndt_lookup(moved, grid)
+        res = np.zeros((len(source), 3))
+        d = moved[mask] - grid['means'][idx]
+        res[mask] = np.einsum('nij,nj->ni', grid['chol'][idx], d)
+        return res.ravel()
+
+    result = least_squares(residuals, np.zeros(6), loss='soft_l1', f_scale=1.0,
+                           max_nfev=max_iteration)
+
+    T = np.eye(4)
+    T[:3, :3] = Rotation.from_rotvec(result.x[:3]).as_matrix()
+    T[:3, 3] = result.x[3:]
+
+    moved = apply(result.x)
+    mask, idx = _ndt_lookup(moved, grid)
+    sq_dist = np.sum((moved[mask] - grid['means'][idx]) ** 2, axis=1)
+    inliers = sq_dist <= max_correspondence ** 2
+    fitness = float(np.count_nonzero(inliers)) / len(source) if len(source) > 0 else 0.0
+    rmse = float(np.sqrt(np.mean(sq_dist[inliers]))) if np.any(inliers) else 0.0
+    return T, fitness, rmse
+
+
+def _nearest_in_window(points: np.ndarray, window, max_distance: float) -> tuple:
+    """
+    Nearest window point for each query point, searching every frame's tree.
+
+    Returns:
+        (distances, matched points, matched normals); distances are inf where
+        no window point lies within max_distance
+    """
+    best_d = np.full(len(points), np.inf)
+    best_q = np.zeros_like(points)
+    best_n = np.zeros_like(points)
+    for target_points, target_normals, tree in window:
+        d, idx = tree.query(points, distance_upper_bound=max_distance, workers=-1)
+        closer = d < best_d
+        best_d[closer] = d[closer]
+        best_q[closer] = target_points[idx[closer]]
+        best_n[closer] = target_normals[idx[closer]]
+    return best_d, best_q, best_n
+
+
+def _point_to_plane_icp(source: np.ndarray, window, max_correspondences, iterations) -> tuple:
+    """
+    Coarse-to-fine point-to-plane ICP against per-frame KD-trees.
+
+    Each window entry is (points, normals, cKDTree) for one frame, built
+    once when the frame enters the window, so a tree is reused for every
+    registration until its frame leaves. Every stage runs Gauss-Newton
+    steps on the linearized point-to-plane error until fitness and rmse
+    stop changing.
+
+    Returns:
+        (4x4 transformation, inlier fraction, inlier rmse) at the finest
+        correspondence distance, matching Open3D's fitness and inlier_rmse
+    """
+    source = source.astype(np.float64)
+    T = np.eye(4)
+    moved = source
+    fitness = rmse = 0.0
+    for max_distance, max_iteration in zip(max_correspondences, iterations):
+        prev_fitness = prev_rmse = None
+        for _ in range(max_iteration):
+            d, q, n = _nearest_in_window(moved, window, max_distance)
+            inliers = np.isfinite(d)
+            fitness = float(np.count_nonzero(inliers)) / len(source) if len(source) > 0 else 0.0
+            rmse = float(np.sqrt(np.mean(d[inliers] ** 2))) if np.any(inliers) else 0.0
+            if prev_fitness is not None and abs(fitness - prev_fitness) < 1e-6 \
+                    and abs(rmse - prev_rmse) < 1e-6:
+                break
+            prev_fitness, prev_rmse = fitness, rmse
+            if np.count_nonzero(inliers) < 6:
+                break
+
+            p, q, n = moved[inliers], q[inliers], n[inliers]
+            residual = np.einsum('ij,ij->i', p - q, n)
+            J = np.hstack([np.cross(p, n), n])
+            delta = np.linalg.solve(J.T @ J + 1e-9 * np.eye(6), -J.T @ residual)
+
+            step = np.eye(4)
+            step[:3, :3] = Rotation.from_rotvec(delta[:3]).as_matrix()
+            step[:3, 3] = delta[3:]
+            T = step @ T
+            moved = source @ T[:3, :3].T + T[:3, 3]
+
+    # Report fitness at the finest correspondence distance for the final pose
+    d, _, _ = _nearest_in_window(moved, window, max_correspondences[-1])
+    inliers = np.isfinite(d)
+    fitness = float(np.count_nonzero(inliers)) / len(source) if len(source) > 0 else 0.0
+    rmse = float(np.sqrt(np.mean(d[inliers] ** 2))) if np.any(inliers) else 0.0
+    return T, fitness, rmse
 
 
 class Operator:
@@ -43,23 +257,40 @@ class Operator:
         self.voxel_size = icp_config.get('voxel_size', 0.1)
         self.max_correspondence = icp_config.get('max_correspondence_distance', 1.0)
         self.max_iteration = icp_config.get('max_iteration', 50)
+        # Below this size CUDA transfer/launch overhead outweighs the speedup
+        self.gpu_min_points = icp_config.get('gpu_min_points', 30000)
+        self._device = o3d.core.Device("CUDA:0" if CUDA_AVAILABLE else "CPU:0")
+        # Sparse frames are registered with NDT instead of point-to-plane ICP
+        self.ndt_max_points = icp_config.get('ndt_max_points', 5000)
+        self.ndt_resolution = icp_config.get('ndt_resolution', 1.0)
 
         # State
         self.poses = [np.eye(4)]  # List of SE3 poses
         self.prev_pcd = None
-        self.world_clouds = []  # Point clouds in world frame for local map
         self.window_size = 5  # Sliding window for local map
+        # (local points, pose) per frame, bounded to the window plus the newest frame
+        self.world_clouds: Deque[tuple] = deque(maxlen=self.window_size + 1)
+        self._pre_cache: Deque[o3d.geometry.PointCloud] = deque(maxlen=self.window_size)  # Preprocessed window frames
+        # (points, normals, KD-tree) per window frame, built once on insert
+        self._window_trees: Deque[tuple] = deque(maxlen=self.window_size)
+        self._ndt_grid = None  # Local map NDT grid, rebuilt on window shift
         self.frame_count = 0
 
-        print(f"[IcpOdometry] Initialized: voxel={self.voxel_size}m, correspondence={self.max_correspondence}m")
+        # Scratch output buffers, reused every frame
+        self._pose_buf = np.empty(16, dtype=np.float32)
+        self._status_buf = np.empty(3, dtype=np.float32)
+
+        # Compile the transform kernel up front rather than on the first frame
+        transform_points(np.zeros((1, 3), dtype=np.float32), np.eye(4))
+
+        print(f"[IcpOdometry] Initialized: voxel={self.voxel_size}m, correspondence={self.max_correspondence}m, "
+              f"cuda={CUDA_AVAILABLE}")
 
     def _load_config(self, config_path: Path) -> dict:
         """Load configuration from YAML file."""
         if config_path.exists():
             try:
-                import yaml
-                with open(config_path) as f:
-                    return yaml.safe_load(f) or {}
+                return load_yaml(config_path)
             except Exception:
                 pass
         return {}
@@ -67,11 +298,17 @@ class Operator:
     def _preprocess(self, points: np.ndarray) -> o3d.geometry.PointCloud:
         """Preprocess point cloud for ICP."""
         pcd = o3d.geometry.PointCloud()
-        pcd.points = o3d.utility.Vector3dVector(points.astype(np.float64))
+        pcd.points = o3d.utility.Vector3dVector(points)
 
         if self.voxel_size > 0:
             pcd = pcd.voxel_down_sample(self.voxel_size)
 
+            # Z-order the points so neighbour searches touch nearby memory
+            down = np.asarray(pcd.points)
+            if len(down) > 0:
+                order = _morton_order(down, self.voxel_size)
+                pcd.points = o3d.utility.Vector3dVector(np.ascontiguousarray(down[order]))
+
         pcd.estimate_normals(
             search_param=o3d.geometry.KDTreeSearchParamHybrid(
                 radius=self.voxel_size * 2, max_nn=30
@@ -79,57 +316,101 @@ class Operator:
         )
         return pcd
 
+    def _store_frame(self, points_local: np.ndarray, pose: np.ndarray):
+        """Store a frame with its pose and its preprocessed local map contribution."""
+        self.world_clouds.append((points_local, pose))
+        # Stride before transforming, only the subsample enters the local map
+        step = max(1, len(points_local) // 5000)
+        strided = np.ascontiguousarray(points_local[::step], dtype=np.float32)
+        # Only the sliding window is ever used as target; the deque drops the oldest
+        pre = self._preprocess(transform_points(strided, pose))
+        self._pre_cache.append(pre)
+        if SCIPY_AVAILABLE:
+            target_points = np.asarray(pre.points)
+            self._window_trees.append((target_points, np.asarray(pre.normals), cKDTree(target_points)))
+        self._ndt_grid = None
+
+    def _local_ndt_grid(self) -> Optional[dict]:
+        """Return the window's NDT grid, built once per window shift."""
+        if self._ndt_grid is None:
+            target_points = np.vstack([np.asarray(c.points) for c in self._pre_cache])
+            self._ndt_grid = _build_ndt_grid(target_points, self.ndt_resolution) or {}
+        return self._ndt_grid or None
+
+    def _run_icp(self, source: o3d.geometry.PointCloud, n_points: int) -> tuple:
+        """Run coarse-to-fine point-to-plane ICP and return (transformation, fitness, rmse)."""
+        max_correspondences = [self.max_correspondence * 4, self.max_correspondence * 2, self.max_correspondence]
+        iterations = [15, 15, self.max_iteration]
+
+        use_gpu = CUDA_AVAILABLE and self.gpu_min_points > 0 and n_points > self.gpu_min_points
+        if SCIPY_AVAILABLE and not use_gpu:
+            # CPU: query the per-frame trees kept for the window instead of
+            # letting Open3D rebuild an index over the merged target each call
+            return _point_to_plane_icp(np.asarray(source.points), self._window_trees,
+                                       max_correspondences, iterations)
+
+        device = self._device if use_gpu else o3d.core.Device("CPU:0")
+        target_pcd = o3d.geometry.PointCloud()
+        for cached in self._pre_cache:
+            target_pcd += cached
+        source_t = o3d.t.geometry.PointCloud.from_legacy(source, device=device)
+        target_t = o3d.t.geometry.PointCloud.from_legacy(target_pcd, device=device)
+
+        # Clouds are already voxelized at the finest scale (-1 skips downsampling)
+        voxel_sizes = o3d.utility.DoubleVector([self.voxel_size * 4, self.voxel_size * 2, -1.0])
+        criteria_list = [
+            o3d.t.pipelines.registration.ICPConvergenceCriteria(max_iteration=n)
+            for n in iterations
+        ]
+
+        result = o3d.t.pipelines.registration.multi_scale_icp(
+            source_t, target_t,
+            voxel_sizes,
+            criteria_list,
+            o3d.utility.DoubleVector(max_correspondences),
+            o3d.core.Tensor.eye(4, o3d.core.float64, device),
+            o3d.t.pipelines.registration.TransformationEstimationPointToPlane()
+        )
+        return result.transformation.cpu().numpy(), result.fitness, result.inlier_rmse
+
     def _register_frame(self, points: np.ndarray) -> tuple:
         """Register current frame and return (pose, fitness, rmse)."""
         if self.frame_count == 0:
             # First frame - identity pose
-            self.world_clouds.append(points.copy())
+            self._store_frame(points, np.eye(4))
             self.frame_count += 1
             return np.eye(4), 1.0, 0.0
 
-        # Build local map from recent frames
-        start_idx = max(0, len(self.world_clouds) - self.window_size)
-        local_map_points = []
-        for i in range(start_idx, len(self.world_clouds)):
-            pts = self.world_clouds[i]
-            step = max(1, len(pts) // 5000)
-            local_map_points.append(pts[::step])
-
-        if local_map_points:
-            local_map_points = np.vstack(local_map_points)
-            target_pcd = self._preprocess(local_map_points)
-        else:
+        # Local map is built from cached preprocessed frames
+        if not self._pre_cache:
             return self.poses[-1].copy(), 0.0, 0.0
 
         # Preprocess current frame
         curr_pcd = self._preprocess(points)
-        curr_pts = np.asarray(curr_pcd.points)
+        curr_pts = np.asarray(curr_pcd.points, dtype=np.float32)
+        curr_normals = np.asarray(curr_pcd.normals, dtype=np.float32)
 
         # Transform current frame to world using previous pose estimate
         prev_pose = self.poses[-1]
-        curr_world = (prev_pose[:3, :3] @ curr_pts.T).T + prev_pose[:3, 3]
+        prev_pose_f32 = prev_pose.astype(np.float32)
+        curr_world = transform_points(curr_pts, prev_pose_f32)
 
         curr_world_pcd = o3d.geometry.PointCloud()
         curr_world_pcd.points = o3d.utility.Vector3dVector(curr_world)
-        curr_world_pcd.estimate_normals(
-            search_param=o3d.geometry.KDTreeSearchParamHybrid(
-                radius=self.voxel_size * 2, max_nn=30
-            )
-        )
-
-        # Run ICP
-        result = o3d.pipelines.registration.registration_icp(
-            curr_world_pcd, target_pcd,
-            self.max_correspondence * 2,
-            np.eye(4),
-            o3d.pipelines.registration.TransformationEstimationPointToPlane(),
-            o3d.pipelines.registration.ICPConvergenceCriteria(
-                max_iteration=self.max_iteration * 2
-            )
-        )
+        # Normals only rotate under a rigid transform, no need to re-estimate
+        curr_world_pcd.normals = o3d.utility.Vector3dVector(curr_normals @ prev_pose_f32[:3, :3].T)
+
+        # Run NDT for sparse frames, ICP otherwise
+        grid = None
+        if SCIPY_AVAILABLE and len(curr_pts) < self.ndt_max_points:
+            grid = self._local_ndt_grid()
+        if grid is not None:
+            T_correction, icp_fitness, icp_rmse = _ndt_align(curr_world, grid, self.max_iteration,
+                                                         self.max_correspondence)
+        else:
+            T_correction, icp_fitness, icp_rmse = self._run_icp(curr_world_pcd, len(points))
 
         # Compute final pose
-        T_correction = result.transformation
         T_abs = T_correction @ prev_pose
 
         # Validate pose jump
@@ -144,15 +425,14 @@ class Operator:
                 T_abs = prev_pose.copy()
             fitness = 0.0
         else:
-            fitness = result.fitness
+            fitness = icp_fitness
 
         # Store for next iteration
         self.poses.append(T_abs)
-        curr_world_final = (T_abs[:3, :3] @ points.T).T + T_abs[:3, 3]
-        self.world_clouds.append(curr_world_final)
+        self._store_frame(points, T_abs)
         self.frame_count += 1
 
-        return T_abs, fitness, result.inlier_rmse
+        return T_abs, fitness, icp_rmse
 
     def on_event(self, dora_event, send_output) -> str:
         if dora_event["type"] == "INPUT":
@@ -169,19 +449,20 @@ class Operator:
                 # Register frame
                 pose, fitness, rmse = self._register_frame(points)
 
-                # Send pose (flattened 4x4 matrix)
-                pose_flat = pose.flatten().astype(np.float32)
+                # Send pose (flattened 4x4 matrix); the cloud's metadata,
+                # including its frame_idx parameter, is forwarded unchanged
+                self._pose_buf[:] = pose.ravel()
                 send_output(
                     "pose",
-                    pa.array(pose_flat, type=pa.float32()),
+                    float32_array(self._pose_buf),
                     dora_event["metadata"]
                 )
 
                 # Send odometry status
-                status = [float(self.frame_count - 1), fitness, rmse]
+                self._status_buf[:] = (self.frame_count - 1, fitness, rmse)
                 send_output(
                     "odometry_status",
-                    pa.array(status, type=pa.float32()),
+                    float32_array(self._status_buf),
                     dora_event["metadata"]
                 )
 
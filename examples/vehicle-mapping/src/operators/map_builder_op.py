@@ -15,11 +15,16 @@ Outputs:
 """
 
 import os
+import sys
 from pathlib import Path
+from typing import Dict, List, Optional
 import numpy as np
 import pyarrow as pa
 from dora import DoraStatus
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.common import load_yaml, transform_points, voxel_downsample_np  # noqa: E402
+
 try:
     import open3d as o3d
     OPEN3D_AVAILABLE = True
@@ -51,21 +56,34 @@ class Operator:
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
         # State
-        self.global_map = o3d.geometry.PointCloud()
+        self._pending_chunks: List[np.ndarray] = []
+        self._map_points_np: Optional[np.ndarray] = None
+        self.n_map_points = 0
+        self.global_map = None
         self.frame_count = 0
-        self.pending_cloud = None
-        self.pending_pose = None
+        # Clouds and poses keyed by the source frame index, which pcd_source
+        # sets as the "frame_idx" metadata parameter and odometry forwards.
+        # Arrival order is only used if the parameter is missing. Entries at
+        # or before the last added frame are dropped, and each dict holds at
+        # most _max_pending frames, so a lost input cannot shift the pairing.
+        self._cloud_by_frame: Dict[int, np.ndarray] = {}
+        self._pose_by_frame: Dict[int, np.ndarray] = {}
+        self._n_clouds = 0
+        self._n_poses = 0
+        self._last_frame = -1
+        self._max_pending = 32
         self.map_saved = False
 
+        # Compile the transform kernel up front rather than on the first frame
+        transform_points(np.zeros((1, 3), dtype=np.float32), np.eye(4))
+
         print(f"[MapBuilder] Initialized: voxel={self.voxel_size}m, output={self.output_dir}")
 
     def _load_config(self, config_path: Path) -> dict:
         """Load configuration from YAML file."""
         if config_path.exists():
             try:
-                import yaml
-                with open(config_path) as f:
-                    return yaml.safe_load(f) or {}
+                return load_yaml(config_path)
             except Exception:
                 pass
         return {}
@@ -76,82 +94,131 @@ class Operator:
             return
 
         # Transform points to world frame
-        R = pose[:3, :3]
-        t = pose[:3, 3]
-        points_world = (R @ points.T).T + t
+        points = np.ascontiguousarray(points, dtype=np.float32)
+        points_world = transform_points(points, pose)
 
-        # Add to global map
-        pcd = o3d.geometry.PointCloud()
-        pcd.points = o3d.utility.Vector3dVector(points_world)
-        self.global_map += pcd
+        # Buffer world-frame chunks; concatenated only on downsample
+        self._pending_chunks.append(points_world)
+        self.n_map_points += len(points_world)
 
         self.frame_count += 1
 
         # Periodic downsampling to keep map manageable
         if self.frame_count % self.downsample_interval == 0:
-            self.global_map = self.global_map.voxel_down_sample(self.voxel_size)
+            self._downsample_map()
+
+    def _downsample_map(self):
+        """Merge pending chunks into the map and voxel-filter it."""
+        if self._map_points_np is not None:
+            self._pending_chunks.insert(0, self._map_points_np)
+        if not self._pending_chunks:
+            return
+
+        points = np.concatenate(self._pending_chunks)
+        self._pending_chunks = []
+        self._map_points_np = voxel_downsample_np(points, self.voxel_size)
+        self.n_map_points = len(self._map_points_np)
 
     def _save_map(self):
         """Save the final map."""
         if self.map_saved:
             return
 
+        # Gather every buffered chunk; the final filter runs on the tensor backend
+        chunks = list(self._pending_chunks)
+        if self._map_points_np is not None:
+            chunks.insert(0, self._map_points_np)
+        if not chunks:
+            print("[MapBuilder] Map is empty, nothing to save")
+            self.map_saved = True
+            return
+
+        map_t = o3d.t.geometry.PointCloud(o3d.core.Tensor(np.concatenate(chunks)))
+        self._pending_chunks = []
+        self._map_points_np = None
+
         # Final downsampling
-        self.global_map = self.global_map.voxel_down_sample(self.voxel_size)
+        map_t = map_t.voxel_down_sample(self.voxel_size)
 
         # Remove outliers
-        self.global_map, _ = self.global_map.remove_statistical_outlier(
-            nb_neighbors=20, std_ratio=2.0
-        )
+        map_t, _ = map_t.remove_statistical_outliers(nb_neighbors=20, std_ratio=2.0)
+        self.global_map = map_t
 
         # Save in multiple formats
         ply_path = self.output_dir / 'map.ply'
         pcd_path = self.output_dir / 'map.pcd'
 
-        o3d.io.write_point_cloud(str(ply_path), self.global_map)
-        o3d.io.write_point_cloud(str(pcd_path), self.global_map)
+        o3d.t.io.write_point_cloud(str(ply_path), map_t, write_ascii=False, compressed=True)
+        o3d.t.io.write_point_cloud(str(pcd_path), map_t, write_ascii=False, compressed=True)
 
-        n_points = len(self.global_map.points)
+        n_points = len(map_t.point.positions)
+        self.n_map_points = n_points
         print(f"[MapBuilder] Saved map: {n_points} points")
         print(f"[MapBuilder] Output: {ply_path}")
 
         self.map_saved = True
 
+    @staticmethod
+    def _frame_idx(metadata, fallback: int) -> int:
+        """Source frame index from the metadata parameters, else the fallback."""
+        idx = metadata.get("frame_idx") if metadata else None
+        return fallback if idx is None else int(idx)
+
+    def _stash(self, store: Dict[int, np.ndarray], idx: int, value: np.ndarray,
+               send_output, metadata):
+        """Store a cloud or pose; add its frame to the map once both are present."""
+        if idx <= self._last_frame:
+            return
+        store[idx] = value
+        while len(store) > self._max_pending:
+            store.pop(next(iter(store)))
+
+        if idx not in self._cloud_by_frame or idx not in self._pose_by_frame:
+            return
+
+        points = self._cloud_by_frame.pop(idx)
+        pose = self._pose_by_frame.pop(idx)
+        # Anything older can no longer be paired
+        self._last_frame = idx
+        for pending in (self._cloud_by_frame, self._pose_by_frame):
+            for stale in [k for k in pending if k < idx]:
+                del pending[stale]
+
+        self._add_frame(points, pose)
+
+        # Send map stats
+        n_points = self.n_map_points
+        stats = [float(n_points), float(self.frame_count), float(n_points * 12 / 1e6)]
+        send_output(
+            "map_stats",
+            pa.array(stats, type=pa.float32()),
+            metadata
+        )
+
+        if self.frame_count % 10 == 0:
+            print(f"[MapBuilder] Frame {self.frame_count}: {n_points} map points")
+
     def on_event(self, dora_event, send_output) -> str:
         if dora_event["type"] == "INPUT":
             event_id = dora_event["id"]
 
             if event_id == "pointcloud":
-                # Store pending point cloud
                 points_flat = dora_event["value"].to_numpy()
                 if len(points_flat) > 0:
-                    self.pending_cloud = points_flat.reshape(-1, 3)
+                    metadata = dora_event["metadata"]
+                    idx = self._frame_idx(metadata, self._n_clouds)
+                    self._n_clouds += 1
+                    self._stash(self._cloud_by_frame, idx, points_flat.reshape(-1, 3),
+                                send_output, metadata)
 
             elif event_id == "pose":
-                # Store pending pose
                 pose_flat = dora_event["value"].to_numpy()
                 if len(pose_flat) == 16:
-                    self.pending_pose = pose_flat.reshape(4, 4)
-
-                # Process if we have both cloud and pose
-                if self.pending_cloud is not None and self.pending_pose is not None:
-                    self._add_frame(self.pending_cloud, self.pending_pose)
-
-                    # Send map stats
-                    n_points = len(self.global_map.points)
-                    stats = [float(n_points), float(self.frame_count), float(n_points * 12 / 1e6)]
-                    send_output(
-                        "map_stats",
-                        pa.array(stats, type=pa.float32()),
-                        dora_event["metadata"]
-                    )
-
-                    if self.frame_count % 10 == 0:
-                        print(f"[MapBuilder] Frame {self.frame_count}: {n_points} map points")
-
-                    # Clear pending
-                    self.pending_cloud = None
-                    self.pending_pose = None
+                    metadata = dora_event["metadata"]
+                    idx = self._frame_idx(metadata, self._n_poses)
+                    self._n_poses += 1
+                    self._stash(self._pose_by_frame, idx, pose_flat.reshape(4, 4),
+                                send_output, metadata)
 
             elif event_id == "sequence_complete":
                 # Get expected frame count from the signal
@@ -29,7 +29,9 @@ class Operator:
 
     def __init__(self):
         self.initialized = False
-        self.trajectory = []
+        # Trajectory buffer, doubled when full
+        self._traj = np.empty((1024, 3), dtype=np.float32)
+        self._traj_len = 0
         self.frame_count = 0
 
         if RERUN_AVAILABLE:
@@ -39,6 +41,13 @@ class Operator:
 
             # Setup 3D view
             rr.log("world", rr.ViewCoordinates.RIGHT_HAND_Z_UP, static=True)
+
+            # Robot marker lives in the robot frame, so it follows the pose transform
+            rr.log(
+                "world/robot/marker",
+                rr.Points3D([[0.0, 0.0, 0.0]], colors=[255, 0, 0], radii=0.15),
+                static=True
+            )
         else:
             print("[MapVisualizer] Running without visualization")
 
@@ -71,39 +80,30 @@ class Operator:
                     pos = pose[:3, 3]
 
                     # Add to trajectory
-                    self.trajectory.append(pos.copy())
+                    if self._traj_len == len(self._traj):
+                        grown = np.empty((2 * len(self._traj), 3), dtype=np.float32)
+                        grown[:self._traj_len] = self._traj
+                        self._traj = grown
+                    self._traj[self._traj_len] = pos
+                    self._traj_len += 1
                     self.frame_count += 1
 
-                    # Visualize robot position
+                    rr.set_time("frame", sequence=self.frame_count)
+
+                    # Robot pose; Rerun draws the transform's axis triad
                     rr.log(
                         "world/robot",
-                        rr.Points3D([pos], colors=[255, 0, 0], radii=0.15)
+                        rr.Transform3D(translation=pos, mat3x3=pose[:3, :3])
                     )
 
                     # Visualize trajectory
-                    if len(self.trajectory) >= 2:
-                        traj_array = np.array(self.trajectory)
+                    if self._traj_len >= 2:
+                        traj_array = self._traj[:self._traj_len]
                         rr.log(
                             "world/trajectory",
                             rr.LineStrips3D([traj_array], colors=[0, 255, 0], radii=0.03)
                         )
 
-                    # Visualize coordinate frame
-                    R = pose[:3, :3]
-                    arrow_len = 0.3
-                    x_axis = pos + R @ np.array([arrow_len, 0, 0])
-                    y_axis = pos + R @ np.array([0, arrow_len, 0])
-                    z_axis = pos + R @ np.array([0, 0, arrow_len])
-
-                    rr.log(
-                        "world/robot/x_axis",
-                        rr.Arrows3D(origins=[pos], vectors=[x_axis - pos], colors=[255, 0, 0])
-                    )
-                    rr.log(
-                        "world/robot/y_axis",
-                        rr.Arrows3D(origins=[pos], vectors=[y_axis - pos], colors=[0, 255, 0])
-                    )
-
             elif event_id == "frame_info":
                 # Log frame info as text
                 info = dora_event["value"].to_numpy()
@@ -14,13 +14,19 @@ Outputs:
 """
 
 import os
+import sys
 import json
+import queue
+import threading
 from pathlib import Path
 from typing import List
 import numpy as np
 import pyarrow as pa
 from dora import DoraStatus
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.common import float32_array, load_yaml, voxel_downsample_np  # noqa: E402
+
 try:
     import open3d as o3d
     OPEN3D_AVAILABLE = True
@@ -28,6 +34,54 @@ except ImportError:
     OPEN3D_AVAILABLE = False
 
 
+def _parse_pcd_header(path: Path):
+    """
+    Parse a PCD header for the binary fast path.
+
+    Returns:
+        (header_bytes, record dtype, n_points), or None if the file is not an
+        uncompressed binary PCD with x/y/z fields
+    """
+    header = {}
+    with open(path, 'rb') as f:
+        for _ in range(20):
+            line = f.readline()
+            if not line:
+                return None
+            parts = line.decode('ascii', errors='replace').split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            header[parts[0].upper()] = parts[1:]
+            if parts[0].upper() == 'DATA':
+                break
+        header_bytes = f.tell()
+
+    if header.get('DATA') != ['binary'] or 'FIELDS' not in header:
+        return None
+
+    fields = header['FIELDS']
+    sizes = header.get('SIZE', [])
+    types = header.get('TYPE', [])
+    counts = header.get('COUNT', ['1'] * len(fields))
+    if not (len(fields) == len(sizes) == len(types) == len(counts)):
+        return None
+    if not {'x', 'y', 'z'} <= set(fields):
+        return None
+
+    dtype_fields = []
+    for i, (name, size, typ, count) in enumerate(zip(fields, sizes, types, counts)):
+        kind = {'F': 'f', 'I': 'i', 'U': 'u'}.get(typ.upper())
+        if kind is None:
+            return None
+        # Padding fields may repeat (e.g. "_"), so only x/y/z keep their names
+        field_name = name if name in ('x', 'y', 'z') else f'_f{i}'
+        fmt = f'<{kind}{size}'
+        dtype_fields.append((field_name, fmt) if int(count) == 1 else (field_name, fmt, (int(count),)))
+
+    n_points = int(header.get('POINTS', ['0'])[0])
+    return header_bytes, np.dtype(dtype_fields), n_points
+
+
 class Operator:
     """DORA Operator for PCD file source."""
 
@@ -55,6 +109,17 @@ class Operator:
         self.voxel_size = loader_config.get('voxel_size', 0.1)
         self.min_range = loader_config.get('min_range', 0.5)
         self.max_range = loader_config.get('max_range', 50.0)
+        self._min_range_sq = self.min_range ** 2
+        self._max_range_sq = self.max_range ** 2
+
+        # Scratch buffer for frame_info, reused every tick
+        self._frame_info_buf = np.empty(3, dtype=np.float32)
+
+        # Prefetch upcoming frames so ticks only pay for a queue pop
+        self._prefetch_q = queue.Queue(maxsize=3)
+        self._stop_prefetch = threading.Event()
+        self._prefetch_thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self._prefetch_thread.start()
 
         print(f"[PcdSource] Data directory: {self.data_dir}")
         print(f"[PcdSource] Found {len(self.pcd_files)} PCD files")
@@ -64,9 +129,7 @@ class Operator:
         """Load configuration from YAML file."""
         if config_path.exists():
             try:
-                import yaml
-                with open(config_path) as f:
-                    return yaml.safe_load(f) or {}
+                return load_yaml(config_path)
             except Exception:
                 pass
         return {}
@@ -83,27 +146,67 @@ class Operator:
 
     def _load_and_preprocess(self, pcd_path: Path) -> np.ndarray:
         """Load and preprocess a PCD file."""
-        # Load PCD
-        pcd = o3d.io.read_point_cloud(str(pcd_path))
-        points = np.asarray(pcd.points).astype(np.float32)
+        # Load PCD, reading uncompressed binary payloads directly
+        layout = _parse_pcd_header(pcd_path)
+        if layout is not None:
+            header_bytes, record, n_points = layout
+            data = np.fromfile(pcd_path, dtype=record, count=n_points, offset=header_bytes)
+            points = np.empty((len(data), 3), dtype=np.float32)
+            points[:, 0] = data['x']
+            points[:, 1] = data['y']
+            points[:, 2] = data['z']
+        else:
+            pcd = o3d.io.read_point_cloud(str(pcd_path))
+            points = np.asarray(pcd.points).astype(np.float32)
 
         if len(points) == 0:
             return np.zeros((0, 3), dtype=np.float32)
 
         # Range filtering
-        distances = np.linalg.norm(points, axis=1)
-        mask = (distances >= self.min_range) & (distances <= self.max_range)
+        d2 = np.einsum('ij,ij->i', points, points)
+        mask = (d2 >= self._min_range_sq) & (d2 <= self._max_range_sq)
         points = points[mask]
 
         # Voxel downsampling
         if self.voxel_size > 0 and len(points) > 0:
-            pcd_filtered = o3d.geometry.PointCloud()
-            pcd_filtered.points = o3d.utility.Vector3dVector(points)
-            pcd_down = pcd_filtered.voxel_down_sample(self.voxel_size)
-            points = np.asarray(pcd_down.points).astype(np.float32)
+            points = voxel_downsample_np(points, self.voxel_size)
 
         return points
 
+    def _prefetch_loop(self):
+        """Load and preprocess frames in order into the prefetch queue.
+
+        A frame that fails to load is queued as its exception, which
+        ends prefetching and is re-raised on the tick that reaches it.
+        """
+        for idx, pcd_path in enumerate(self.pcd_files):
+            try:
+                item = (idx, self._load_and_preprocess(pcd_path))
+            except Exception as e:
+                item = (idx, e)
+            while not self._stop_prefetch.is_set():
+                try:
+                    self._prefetch_q.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if self._stop_prefetch.is_set() or isinstance(item[1], Exception):
+                return
+
+    def _next_prefetched(self) -> np.ndarray:
+        """Pop the next prefetched frame, surfacing loader failures."""
+        while True:
+            try:
+                idx, points = self._prefetch_q.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not self._prefetch_thread.is_alive() and self._prefetch_q.empty():
+                    raise RuntimeError(
+                        f"PCD prefetch thread exited before frame {self.current_frame}")
+        if isinstance(points, Exception):
+            raise RuntimeError(f"Failed to load {self.pcd_files[idx]}") from points
+        return points
+
     def on_event(self, dora_event, send_output) -> str:
         if dora_event["type"] == "INPUT":
             event_id = dora_event["id"]
@@ -111,28 +214,28 @@ class Operator:
             if event_id == "tick":
                 if self.current_frame < len(self.pcd_files):
                     # Load and publish point cloud
-                    pcd_path = self.pcd_files[self.current_frame]
-                    points = self._load_and_preprocess(pcd_path)
+                    points = self._next_prefetched()
 
                     # Flatten points for transmission [x1,y1,z1, x2,y2,z2, ...]
                     points_flat = points.flatten()
 
+                    # Tag the cloud with its frame index; odometry forwards the
+                    # metadata on its pose so downstream nodes can pair them
+                    metadata = dict(dora_event["metadata"])
+                    metadata["frame_idx"] = self.current_frame
+
                     # Send point cloud
                     send_output(
                         "pointcloud",
                         pa.array(points_flat, type=pa.float32()),
-                        dora_event["metadata"]
+                        metadata
                     )
 
                     # Send frame info [frame_idx, total_frames, n_points]
-                    frame_info = [
-                        float(self.current_frame),
-                        float(len(self.pcd_files)),
-                        float(len(points))
-                    ]
+                    self._frame_info_buf[:] = (self.current_frame, len(self.pcd_files), len(points))
                     send_output(
                         "frame_info",
-                        pa.array(frame_info, type=pa.float32()),
+                        float32_array(self._frame_info_buf),
                         dora_event["metadata"]
                     )
 
@@ -152,6 +255,7 @@ class Operator:
                     print(f"[PcdSource] Sequence complete: {len(self.pcd_files)} frames")
 
         elif dora_event["type"] == "STOP":
+            self._stop_prefetch.set()
             print("[PcdSource] Stopped")
             return DoraStatus.STOP
 
@@ -13,12 +13,73 @@ Outputs:
     - trajectory: Full trajectory as flattened array
 """
 
+import heapq
 import os
+import sys
 from pathlib import Path
+from typing import Optional
 import numpy as np
-import pyarrow as pa
 from dora import DoraStatus
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.common import float32_array, load_yaml  # noqa: E402
+from src.waypoint_extractor import min_distance_indices, rotation_matrices_to_quaternions  # noqa: E402
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _rdp_mask(points, eps, out_mask):
+        """Iterative Douglas-Peucker over (N, 2) points, marking kept vertices."""
+        n = points.shape[0]
+        out_mask[:] = False
+        out_mask[0] = True
+        out_mask[n - 1] = True
+
+        stack = np.empty((n, 2), dtype=np.int64)
+        stack[0, 0] = 0
+        stack[0, 1] = n - 1
+        top = 1
+
+        while top > 0:
+            top -= 1
+            lo = stack[top, 0]
+            hi = stack[top, 1]
+            if hi - lo < 2:
+                continue
+
+            x0 = points[lo, 0]
+            y0 = points[lo, 1]
+            vx = points[hi, 0] - x0
+            vy = points[hi, 1] - y0
+            line_len = np.sqrt(vx * vx + vy * vy)
+            if line_len < 1e-6:
+                # Closed segment (e.g. a loop): keep only its endpoints
+                continue
+
+            max_dist = -1.0
+            split = lo + 1
+            for i in range(lo + 1, hi):
+                dx = points[i, 0] - x0
+                dy = points[i, 1] - y0
+                dist = abs(vx * dy - vy * dx) / line_len
+                if dist > max_dist:
+                    max_dist = dist
+                    split = i
+
+            if max_dist > eps:
+                out_mask[split] = True
+                stack[top, 0] = lo
+                stack[top, 1] = split
+                stack[top + 1, 0] = split
+                stack[top + 1, 1] = hi
+                top += 2
+
 
 class Operator:
     """DORA Operator for Waypoint Extraction."""
@@ -33,6 +94,7 @@ class Operator:
         self.min_spacing = wp_config.get('min_spacing', 0.5)
         self.simplify = wp_config.get('simplify', False)
         self.epsilon = wp_config.get('epsilon', 0.1)
+        self.max_waypoints = wp_config.get('max_waypoints')  # None = no cap
 
         # Output directory
         self.output_dir = Path(os.environ.get(
@@ -42,8 +104,12 @@ class Operator:
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
         # State
-        self.poses = []
+        self._cap = 1024
+        self.poses_buf = np.empty((self._cap, 4, 4), dtype=np.float64)
+        self.xy_buf = np.empty((self._cap, 2), dtype=np.float64)  # Pose XY, kept in step
+        self.n_poses = 0
         self.waypoints_extracted = False
+        self._scratch = None  # float32 output buffer reused across sends
 
         print(f"[WaypointExtractor] Initialized: spacing={self.min_spacing}m, simplify={self.simplify}")
 
@@ -51,74 +117,94 @@ class Operator:
         """Load configuration from YAML file."""
         if config_path.exists():
             try:
-                import yaml
-                with open(config_path) as f:
-                    return yaml.safe_load(f) or {}
+                return load_yaml(config_path)
             except Exception:
                 pass
         return {}
 
-    def _douglas_peucker(self, points: np.ndarray, epsilon: float) -> np.ndarray:
-        """Simplify trajectory using Douglas-Peucker algorithm."""
+    @staticmethod
+    def _max_deviation(points: np.ndarray, lo: int, hi: int) -> tuple:
+        """
+        Return (max distance, index) of interior points from the segment lo-hi.
+
+        A closed segment (e.g. a loop) reports no deviation, so it keeps
+        only its endpoints.
+        """
+        v = points[hi] - points[lo]
+        line_len = np.hypot(v[0], v[1])
+        if line_len < 1e-6:
+            return 0.0, lo + 1
+
+        inner = points[lo + 1:hi] - points[lo]
+        dists = np.abs(v[0] * inner[:, 1] - v[1] * inner[:, 0]) / line_len
+
+        k = int(np.argmax(dists))
+        return float(dists[k]), lo + 1 + k
+
+    def _douglas_peucker(self, points: np.ndarray, epsilon: float,
+                         max_waypoints: Optional[int] = None) -> np.ndarray:
+        """
+        Simplify trajectory using Douglas-Peucker algorithm.
+
+        Segments are split best-first (largest deviation first), so with
+        max_waypoints set the result keeps the most significant vertices.
+        """
         if len(points) <= 2:
             return points
 
-        # Find point with maximum distance from line
-        start, end = points[0], points[-1]
-        line_vec = end - start
-        line_len = np.linalg.norm(line_vec)
+        keep = np.zeros(len(points), dtype=bool)
+        if NUMBA_AVAILABLE and max_waypoints is None:
+            # Without a cap the split order does not matter; run it compiled
+            _rdp_mask(np.ascontiguousarray(points, dtype=np.float64), epsilon, keep)
+            return points[keep]
 
-        if line_len < 1e-6:
-            return np.array([start, end])
-
-        line_unit = line_vec / line_len
-
-        max_dist = 0
-        max_idx = 0
-        for i in range(1, len(points) - 1):
-            vec = points[i] - start
-            proj_len = np.dot(vec, line_unit)
-            proj = start + proj_len * line_unit
-            dist = np.linalg.norm(points[i] - proj)
-
-            if dist > max_dist:
-                max_dist = dist
-                max_idx = i
-
-        # Recursively simplify
-        if max_dist > epsilon:
-            left = self._douglas_peucker(points[:max_idx + 1], epsilon)
-            right = self._douglas_peucker(points[max_idx:], epsilon)
-            return np.vstack([left[:-1], right])
-        else:
-            return np.array([start, end])
+        keep[0] = keep[-1] = True
+        n_kept = 2
+
+        heap = []
+
+        def push(lo: int, hi: int):
+            if hi - lo >= 2:
+                dev, split = self._max_deviation(points, lo, hi)
+                heapq.heappush(heap, (-dev, lo, hi, split))
+
+        push(0, len(points) - 1)
+        while heap:
+            neg_dev, lo, hi, split = heapq.heappop(heap)
+            if -neg_dev <= epsilon:
+                break
+            if max_waypoints is not None and n_kept >= max_waypoints:
+                break
+
+            keep[split] = True
+            n_kept += 1
+            push(lo, split)
+            push(split, hi)
+
+        return points[keep]
+
+    def _trajectory_xy(self) -> np.ndarray:
+        """XY positions of all accumulated poses (a view, not a copy)."""
+        return self.xy_buf[:self.n_poses]
 
     def _extract_waypoints(self) -> np.ndarray:
         """Extract waypoints from trajectory."""
-        if len(self.poses) == 0:
+        if self.n_poses == 0:
             return np.zeros((0, 2))
 
         # Extract XY positions from poses
-        trajectory = np.array([[p[0, 3], p[1, 3]] for p in self.poses])
+        trajectory = self._trajectory_xy()
 
         if self.simplify:
             # Use Douglas-Peucker simplification
-            waypoints = self._douglas_peucker(trajectory, self.epsilon)
+            waypoints = self._douglas_peucker(trajectory, self.epsilon, self.max_waypoints)
         else:
             # Use minimum spacing
-            waypoints = [trajectory[0]]
-            for i in range(1, len(trajectory)):
-                dist = np.linalg.norm(trajectory[i] - waypoints[-1])
-                if dist >= self.min_spacing:
-                    waypoints.append(trajectory[i])
+            waypoints = trajectory[min_distance_indices(trajectory, self.min_spacing)]
 
             # Always include last point
-            if len(waypoints) > 0:
-                last_dist = np.linalg.norm(trajectory[-1] - waypoints[-1])
-                if last_dist > 0.1:
-                    waypoints.append(trajectory[-1])
-
-            waypoints = np.array(waypoints)
+            if np.linalg.norm(trajectory[-1] - waypoints[-1]) > 0.1:
+                waypoints = np.vstack([waypoints, trajectory[-1]])
 
         return waypoints
 
@@ -126,77 +212,84 @@ class Operator:
         """Save waypoints and trajectory to files."""
         # Save waypoints
         wp_path = self.output_dir / 'waypoints.txt'
-        with open(wp_path, 'w') as f:
+        with open(wp_path, 'w', buffering=1 << 20) as f:
             f.write("# Waypoints extracted from DORA mapping\n")
             f.write("# Format: x y (meters)\n")
             f.write(f"# Total waypoints: {len(waypoints)}\n\n")
-            for x, y in waypoints:
-                f.write(f"{x:.4f} {y:.4f}\n")
+            np.savetxt(f, waypoints, fmt='%.4f %.4f')
 
         # Save trajectory
         traj_path = self.output_dir / 'trajectory.txt'
-        with open(traj_path, 'w') as f:
+        with open(traj_path, 'w', buffering=1 << 20) as f:
             f.write("# Trajectory from DORA mapping\n")
             f.write("# Format: id x y z qx qy qz qw\n\n")
-            for i, pose in enumerate(self.poses):
-                x, y, z = pose[:3, 3]
-                # Extract quaternion from rotation matrix
-                qw = np.sqrt(1 + pose[0, 0] + pose[1, 1] + pose[2, 2]) / 2
-                qw = max(qw, 1e-6)
-                qx = (pose[2, 1] - pose[1, 2]) / (4 * qw)
-                qy = (pose[0, 2] - pose[2, 0]) / (4 * qw)
-                qz = (pose[1, 0] - pose[0, 1]) / (4 * qw)
-                f.write(f"{i} {x:.6f} {y:.6f} {z:.6f} {qx:.6f} {qy:.6f} {qz:.6f} {qw:.6f}\n")
+            poses = self.poses_buf[:self.n_poses]
+            data = np.column_stack([
+                np.arange(self.n_poses),
+                poses[:, :3, 3],
+                rotation_matrices_to_quaternions(poses[:, :3, :3]),
+            ])
+            np.savetxt(f, data, fmt='%d %.6f %.6f %.6f %.6f %.6f %.6f %.6f')
 
         print(f"[WaypointExtractor] Saved {len(waypoints)} waypoints to {wp_path}")
         print(f"[WaypointExtractor] Saved trajectory to {traj_path}")
 
+    def _send_float32(self, send_output, output_id: str, values: np.ndarray, metadata):
+        """Send values as a flat float32 array staged in the reusable scratch buffer."""
+        if self._scratch is None or self._scratch.size < values.size:
+            self._scratch = np.empty(max(values.size * 2, 64), dtype=np.float32)
+        out = self._scratch[:values.size]
+        np.copyto(out, values.ravel())
+        send_output(output_id, float32_array(out), metadata)
+
     def on_event(self, dora_event, send_output) -> str:
         if dora_event["type"] == "INPUT":
             event_id = dora_event["id"]
 
             if event_id == "pose":
-                # Accumulate poses
-                pose_flat = dora_event["value"].to_numpy()
-                if len(pose_flat) == 16:
-                    pose = pose_flat.reshape(4, 4)
-                    self.poses.append(pose)
+                # Accumulate poses, viewing the float32 Arrow buffer without a copy
+                value = dora_event["value"]
+                if len(value) == 16:
+                    pose_view = np.frombuffer(
+                        value.buffers()[1], dtype=np.float32, count=16, offset=value.offset * 4
+                    )
+                    if self.n_poses == self._cap:
+                        self._cap *= 2
+                        grown = np.empty((self._cap, 4, 4), dtype=np.float64)
+                        grown[:self.n_poses] = self.poses_buf[:self.n_poses]
+                        self.poses_buf = grown
+                        grown_xy = np.empty((self._cap, 2), dtype=np.float64)
+                        grown_xy[:self.n_poses] = self.xy_buf[:self.n_poses]
+                        self.xy_buf = grown_xy
+                    np.copyto(self.poses_buf[self.n_poses], pose_view.reshape(4, 4))
+                    self.xy_buf[self.n_poses] = pose_view[[3, 7]]
+                    self.n_poses += 1
 
             elif event_id == "map_complete":
-                if not self.waypoints_extracted and len(self.poses) > 0:
+                if not self.waypoints_extracted and self.n_poses > 0:
                     # Extract waypoints
                     waypoints = self._extract_waypoints()
 
                     # Extract trajectory
-                    trajectory = np.array([[p[0, 3], p[1, 3]] for p in self.poses])
+                    trajectory = self._trajectory_xy()
 
                     # Save to files
                     self._save_outputs(waypoints, trajectory)
 
                     # Send waypoints
-                    wp_flat = waypoints.flatten().astype(np.float32)
-                    send_output(
-                        "waypoints",
-                        pa.array(wp_flat, type=pa.float32()),
-                        dora_event["metadata"]
-                    )
+                    self._send_float32(send_output, "waypoints", waypoints, dora_event["metadata"])
 
                     # Send trajectory
-                    traj_flat = trajectory.flatten().astype(np.float32)
-                    send_output(
-                        "trajectory",
-                        pa.array(traj_flat, type=pa.float32()),
-                        dora_event["metadata"]
-                    )
+                    self._send_float32(send_output, "trajectory", trajectory, dora_event["metadata"])
 
                     self.waypoints_extracted = True
-                    print(f"[WaypointExtractor] Extracted {len(waypoints)} waypoints from {len(self.poses)} poses")
+                    print(f"[WaypointExtractor] Extracted {len(waypoints)} waypoints from {self.n_poses} poses")
 
         elif dora_event["type"] == "STOP":
             # Extract waypoints on stop if not done
-            if not self.waypoints_extracted and len(self.poses) > 0:
+            if not self.waypoints_extracted and self.n_poses > 0:
                 waypoints = self._extract_waypoints()
-                trajectory = np.array([[p[0, 3], p[1, 3]] for p in self.poses])
+                trajectory = self._trajectory_xy()
                 self._save_outputs(waypoints, trajectory)
             print(f"[WaypointExtractor] Stopped")
             return DoraStatus.STOP
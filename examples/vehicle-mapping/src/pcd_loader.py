@@ -6,16 +6,25 @@ This module handles loading point cloud data from PCD files,
 with preprocessing options for range filtering and downsampling.
 """
 
+import functools
 import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
 import numpy as np
 
+from .common import voxel_downsample_np
+
 try:
     import open3d as o3d
 except ImportError:
     raise ImportError("Please install open3d: pip install open3d")
 
+_NUM_RE = re.compile(r'^-?\d+\.?\d*$')
+_TS_RE = re.compile(r'\d+\.?\d*')
+
 
 class PCDLoader:
     """Load and preprocess PCD sequences from 32-line LiDAR."""
@@ -42,15 +51,23 @@ class PCDLoader:
         self.remove_ground = config.get('remove_ground', False)
         self.ground_threshold = config.get('ground_threshold', -1.5)
 
+        self._pcd_files: Optional[List[Path]] = None
+
         if not self.data_dir.exists():
             raise FileNotFoundError(f"Data directory not found: {self.data_dir}")
 
     def get_pcd_files(self) -> List[Path]:
-        """Get sorted list of PCD files in directory."""
-        pcd_files = sorted(self.data_dir.glob("*.pcd"))
-        if not pcd_files:
-            raise FileNotFoundError(f"No PCD files found in {self.data_dir}")
-        return pcd_files
+        """Get sorted list of PCD files in directory (listed once, then cached)."""
+        if self._pcd_files is None:
+            pcd_files = sorted(self.data_dir.glob("*.pcd"))
+            if not pcd_files:
+                raise FileNotFoundError(f"No PCD files found in {self.data_dir}")
+            self._pcd_files = pcd_files
+        return self._pcd_files
+
+    def invalidate_cache(self):
+        """Forget the cached file listing so the next call rescans the directory."""
+        self._pcd_files = None
 
     def load_pcd(self, file_path: Path) -> np.ndarray:
         """
@@ -79,45 +96,90 @@ class PCDLoader:
         if len(points) == 0:
             return points
 
-        # Range filter
-        distances = np.linalg.norm(points, axis=1)
-        mask = (distances >= self.min_range) & (distances <= self.max_range)
+        # Range filter and ground removal (simple height threshold) in one mask
+        x, y, z = points[:, 0], points[:, 1], points[:, 2]
+        d2 = x * x + y * y + z * z
+        mask = (d2 >= self.min_range ** 2) & (d2 <= self.max_range ** 2)
+        if self.remove_ground:
+            mask &= z > self.ground_threshold
         points = points[mask]
 
-        # Ground removal (simple height threshold)
-        if self.remove_ground and len(points) > 0:
-            mask = points[:, 2] > self.ground_threshold
-            points = points[mask]
-
         # Voxel downsampling
         if self.voxel_size > 0 and len(points) > 0:
-            pcd = o3d.geometry.PointCloud()
-            pcd.points = o3d.utility.Vector3dVector(points)
-            pcd = pcd.voxel_down_sample(self.voxel_size)
-            points = np.asarray(pcd.points)
+            points = voxel_downsample_np(points, self.voxel_size)
+
+        return points
+
+    def iter_sequence(self, preprocess: bool = True) -> Iterator[Tuple[Path, np.ndarray]]:
+        """
+        Stream PCD files in sequence order, one frame at a time.
+
+        Frames are not retained, so memory stays at a single frame for
+        consumers that do not need random access.
+
+        Args:
+            preprocess: Whether to preprocess point clouds
+
+        Yields:
+            Tuple of (file_path, points)
+        """
+        for file_path in self.get_pcd_files():
+            yield file_path, self._load(file_path, preprocess)
+
+    def iter_sequence_prefetched(self, preprocess: bool = True, workers: int = 4,
+                                 prefetch: int = 8) -> Iterator[Tuple[Path, np.ndarray]]:
+        """
+        Stream PCD files in order while loading upcoming frames on a thread pool.
+
+        Open3D file reading runs outside the GIL, so up to `prefetch` frames are
+        read and preprocessed in the background while the current one is consumed.
+
+        Args:
+            preprocess: Whether to preprocess point clouds
+            workers: Number of loader threads
+            prefetch: Maximum number of frames loaded ahead
 
+        Yields:
+            Tuple of (file_path, points)
+        """
+        pcd_files = iter(self.get_pcd_files())
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for file_path in pcd_files:
+                pending.append((file_path, executor.submit(self._load, file_path, preprocess)))
+                if len(pending) >= prefetch:
+                    break
+
+            while pending:
+                file_path, future = pending.popleft()
+                next_path = next(pcd_files, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(self._load, next_path, preprocess)))
+                yield file_path, future.result()
+
+    def _load(self, file_path: Path, preprocess: bool) -> np.ndarray:
+        """Load one PCD file, optionally preprocessed."""
+        points = self.load_pcd(file_path)
+        if preprocess:
+            points = self.preprocess(points)
         return points
 
     def load_sequence(self, preprocess: bool = True) -> Tuple[List[Path], List[np.ndarray]]:
         """
         Load all PCD files in sequence order.
 
+        Holds every frame in memory; prefer iter_sequence() when frames are
+        consumed once in order.
+
         Args:
             preprocess: Whether to preprocess point clouds
 
         Returns:
             Tuple of (file_paths, point_clouds)
         """
-        pcd_files = self.get_pcd_files()
-        point_clouds = []
-
-        for file_path in pcd_files:
-            points = self.load_pcd(file_path)
-            if preprocess:
-                points = self.preprocess(points)
-            point_clouds.append(points)
-
-        return pcd_files, point_clouds
+        point_clouds = [points for _, points in self.iter_sequence_prefetched(preprocess)]
+        return self.get_pcd_files(), point_clouds
 
     def load_frame(self, index: int, preprocess: bool = True) -> Tuple[Path, np.ndarray]:
         """
@@ -147,13 +209,10 @@ class PCDLoader:
 
     def __iter__(self):
         """Iterate over all frames."""
-        pcd_files = self.get_pcd_files()
-        for file_path in pcd_files:
-            points = self.load_pcd(file_path)
-            points = self.preprocess(points)
-            yield file_path, points
+        return self.iter_sequence(preprocess=True)
 
 
+@functools.lru_cache(maxsize=4096)
 def extract_timestamp_from_filename(filename: str) -> Optional[float]:
     """
     Extract timestamp from PCD filename.
@@ -165,15 +224,12 @@ def extract_timestamp_from_filename(filename: str) -> Optional[float]:
     """
     stem = Path(filename).stem
 
-    # Try numeric format
-    try:
+    # Pure numeric format
+    if _NUM_RE.match(stem):
         return float(stem)
-    except ValueError:
-        pass
 
     # Try extracting numbers
-    import re
-    numbers = re.findall(r'\d+\.?\d*', stem)
+    numbers = _TS_RE.findall(stem)
     if numbers:
         return float(numbers[-1])
 
@@ -41,6 +41,14 @@ def pose3_to_matrix(pose: 'Pose3') -> np.ndarray:
     return pose.matrix()
 
 
+def make_noise_model(sigmas) -> 'gtsam.noiseModel.Base':
+    """Build an Isotropic noise model for uniform sigmas, Diagonal otherwise."""
+    sigmas = np.ascontiguousarray(sigmas, dtype=np.float64)
+    if np.all(sigmas == sigmas[0]):
+        return gtsam.noiseModel.Isotropic.Sigma(len(sigmas), float(sigmas[0]))
+    return gtsam.noiseModel.Diagonal.Sigmas(sigmas)
+
+
 class PoseGraphOptimizer:
     """GTSAM-based pose graph optimization."""
 
@@ -53,6 +61,8 @@ class PoseGraphOptimizer:
                 - odom_noise: Odometry noise [rx, ry, rz, tx, ty, tz]
                 - loop_noise: Loop closure noise
                 - prior_noise: Prior factor noise
+                - loop_huber_threshold: Huber kernel threshold for loop
+                  closures, 0 to disable (default: 1.345)
         """
         if not GTSAM_AVAILABLE:
             raise ImportError("gtsam not installed. Install with: conda install -c conda-forge gtsam")
@@ -71,15 +81,17 @@ class PoseGraphOptimizer:
         prior_noise = config.get('prior_noise', [0.01, 0.01, 0.01, 0.01, 0.01, 0.01])
 
         # Create noise models
-        self.noise_model_odom = gtsam.noiseModel.Diagonal.Sigmas(
-            np.array(odom_rot + odom_trans)
-        )
-        self.noise_model_loop = gtsam.noiseModel.Diagonal.Sigmas(
-            np.array(loop_rot + loop_trans)
-        )
-        self.noise_model_prior = gtsam.noiseModel.Diagonal.Sigmas(
-            np.array(prior_noise)
-        )
+        self.noise_model_odom = make_noise_model(np.concatenate([odom_rot, odom_trans]))
+        self.noise_model_prior = make_noise_model(prior_noise)
+
+        # Loop closures get a Huber kernel so a false positive cannot dominate
+        loop_huber = config.get('loop_huber_threshold', 1.345)
+        self.noise_model_loop = make_noise_model(np.concatenate([loop_rot, loop_trans]))
+        if loop_huber and loop_huber > 0:
+            self.noise_model_loop = gtsam.noiseModel.Robust.Create(
+                gtsam.noiseModel.mEstimator.Huber.Create(loop_huber),
+                self.noise_model_loop
+            )
 
         # Factor graph and initial estimates
         self.graph = gtsam.NonlinearFactorGraph()
@@ -195,6 +207,7 @@ class PoseGraphOptimizer:
         Returns:
             Dictionary of optimized poses
         """
+        odom_poses = np.asarray(odom_poses, dtype=np.float64)
         n_poses = len(odom_poses)
         if n_poses == 0:
             return {}
@@ -203,14 +216,19 @@ class PoseGraphOptimizer:
         self.add_prior(0, odom_poses[0])
         self.add_initial_estimate(0, odom_poses[0])
 
+        # Relative poses between consecutive frames, T_prev^-1 @ T_curr,
+        # in closed form for the whole chain
+        R = odom_poses[:, :3, :3]
+        t = odom_poses[:, :3, 3]
+        Rt_prev = np.transpose(R[:-1], (0, 2, 1))
+        relative = np.zeros((n_poses - 1, 4, 4))
+        relative[:, :3, :3] = np.einsum('nij,njk->nik', Rt_prev, R[1:])
+        relative[:, :3, 3] = np.einsum('nij,nj->ni', Rt_prev, t[1:] - t[:-1])
+        relative[:, 3, 3] = 1.0
+
         # Add odometry chain
         for i in range(1, n_poses):
-            # Compute relative pose between consecutive frames
-            T_prev = odom_poses[i - 1]
-            T_curr = odom_poses[i]
-            T_rel = np.linalg.inv(T_prev) @ T_curr
-
-            self.add_odometry_factor(i - 1, i, T_rel)
+            self.add_odometry_factor(i - 1, i, relative[i - 1])
             self.add_initial_estimate(i, odom_poses[i])
 
         # Optimize
@@ -226,17 +244,23 @@ class PoseGraphOptimizer:
         }
 
 
-def compute_trajectory_length(poses: Dict[int, np.ndarray]) -> float:
-    """Compute total trajectory length from poses."""
-    length = 0.0
-    sorted_ids = sorted(poses.keys())
+def compute_trajectory_length(poses) -> float:
+    """
+    Compute total trajectory length from poses.
+
+    Args:
+        poses: Dictionary of pose ID to 4x4 matrix, or an Nx4x4 array
+    """
+    if isinstance(poses, dict):
+        positions = np.array([poses[i][:3, 3] for i in sorted(poses.keys())])
+    else:
+        positions = np.asarray(poses)[:, :3, 3]
 
-    for i in range(1, len(sorted_ids)):
-        p1 = poses[sorted_ids[i - 1]][:3, 3]
-        p2 = poses[sorted_ids[i]][:3, 3]
-        length += np.linalg.norm(p2 - p1)
+    if len(positions) < 2:
+        return 0.0
 
-    return length
+    steps = np.diff(positions, axis=0)
+    return float(np.sqrt(np.einsum('ij,ij->i', steps, steps)).sum())
 
 
 def save_poses_tum(poses: Dict[int, np.ndarray], output_path: str,
@@ -5,18 +5,37 @@ Simple ICP Odometry - Using Open3D for point cloud registration.
 This is a fallback when KISS-ICP is not available or has issues.
 """
 
-from typing import List, Dict
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
 import numpy as np
 
+from .common import transform_points, voxel_downsample_np
+
 try:
     import open3d as o3d
     OPEN3D_AVAILABLE = True
+    CUDA_AVAILABLE = o3d.core.cuda.is_available()
 except ImportError:
     OPEN3D_AVAILABLE = False
+    CUDA_AVAILABLE = False
+
+try:
+    import cupoch as cph
+    CUPOCH_AVAILABLE = True
+except ImportError:
+    CUPOCH_AVAILABLE = False
+
+try:
+    import small_gicp
+    SMALL_GICP_AVAILABLE = True
+except ImportError:
+    SMALL_GICP_AVAILABLE = False
 
 
 class SimpleICPOdometry:
-    """Simple frame-to-frame ICP odometry using Open3D."""
+    """Simple frame-to-frame ICP odometry using Open3D's tensor pipeline."""
 
     def __init__(self, config: dict = None):
         """
@@ -27,35 +46,195 @@ class SimpleICPOdometry:
                 - voxel_size: Voxel size for downsampling (default: 0.1)
                 - max_correspondence_distance: ICP threshold (default: 0.5)
                 - max_iteration: Max ICP iterations (default: 50)
+                - backend: "open3d", "fast" (NumPy voxel filter, Open3D ICP),
+                  "cuda" to run on the GPU via cupoch, or "small_gicp" for
+                  GICP against an incremental Gaussian voxel map
+                  (default: "open3d")
+                - n_workers: Threads used by register_pairs (default: CPU count)
+                - window_max_points: Points kept per frame in the local map
+                  window (default: 5000)
+                - gicp_voxel_resolution: Gaussian voxel map resolution for the
+                  small_gicp backend (default: 1.0)
         """
-        if not OPEN3D_AVAILABLE:
+        config = config or {}
+        self.backend = config.get('backend', 'open3d')
+
+        if self.backend == 'cuda':
+            if not CUPOCH_AVAILABLE:
+                raise ImportError("cupoch not installed")
+        elif self.backend == 'small_gicp':
+            if not SMALL_GICP_AVAILABLE:
+                raise ImportError("small_gicp not installed")
+        elif not OPEN3D_AVAILABLE:
             raise ImportError("open3d not installed")
 
-        config = config or {}
         self.voxel_size = config.get('voxel_size', 0.1)
         self.max_correspondence = config.get('max_correspondence_distance', 0.5)
         self.max_iteration = config.get('max_iteration', 50)
-
-    def preprocess(self, points: np.ndarray) -> o3d.geometry.PointCloud:
+        self.n_workers = config.get('n_workers', os.cpu_count() or 1)
+        self.window_max_points = config.get('window_max_points', 5000)
+        self.gicp_voxel_resolution = config.get('gicp_voxel_resolution', 1.0)
+        self._use_open3d = self.backend in ('open3d', 'fast')
+
+        # Sliding-window local map: strided world clouds, subsampled on insert
+        self._window = deque()
+        self._window_buf = np.empty((0, 3), dtype=np.float32)
+        # Per-frame (points, normals) preprocessed once on insert, so the
+        # target never re-voxelizes or re-estimates normals over the window
+        self._window_pre = deque()
+        # small_gicp: scans are inserted once; stale voxels age out by LRU
+        self._voxelmap = None
+        if self._use_open3d:
+            self.device = o3d.core.Device("CUDA:0" if CUDA_AVAILABLE else "CPU:0")
+
+    def preprocess(self, points: np.ndarray):
         """Preprocess point cloud."""
-        pcd = o3d.geometry.PointCloud()
-        pcd.points = o3d.utility.Vector3dVector(points.astype(np.float64))
+        points = np.ascontiguousarray(points, dtype=np.float32)
+        if self.backend == 'cuda':
+            return self._preprocess_cupoch(points)
+        if self.backend == 'small_gicp':
+            pcd, _ = small_gicp.preprocess_points(
+                points.astype(np.float64), downsampling_resolution=self.voxel_size,
+                num_neighbors=10, num_threads=self.n_workers)
+            return pcd
+        if self.backend == 'fast' and self.voxel_size > 0 and len(points) > 0:
+            points = voxel_downsample_np(points, self.voxel_size, representative=True)
+
+        pcd = o3d.t.geometry.PointCloud(o3d.core.Tensor.from_numpy(points)).to(self.device)
 
         # Voxel downsample
-        if self.voxel_size > 0:
+        if self.backend != 'fast' and self.voxel_size > 0:
             pcd = pcd.voxel_down_sample(self.voxel_size)
 
         # Estimate normals for point-to-plane ICP
+        pcd.estimate_normals(max_nn=30, radius=self.voxel_size * 2)
+
+        return pcd
+
+    def _preprocess_cupoch(self, points: np.ndarray) -> 'cph.geometry.PointCloud':
+        """GPU-resident equivalent of preprocess using cupoch."""
+        pcd = cph.geometry.PointCloud()
+        pcd.points = cph.utility.Vector3fVector(points)
+
+        if self.voxel_size > 0:
+            pcd = pcd.voxel_down_sample(self.voxel_size)
+
         pcd.estimate_normals(
-            search_param=o3d.geometry.KDTreeSearchParamHybrid(
-                radius=self.voxel_size * 2, max_nn=30
-            )
+            cph.geometry.KDTreeSearchParamRadius(radius=self.voxel_size * 2, max_nn=30)
         )
 
         return pcd
 
-    def register_pair(self, source: o3d.geometry.PointCloud,
-                      target: o3d.geometry.PointCloud,
+    def _register(self, source, target, max_distance: float, max_iteration: int,
+                  init_transform: np.ndarray) -> tuple:
+        """Point-to-plane ICP on the configured backend; returns (transformation, fitness, rmse)."""
+        if self._use_open3d:
+            return self._multi_scale_icp(source, target, max_distance, max_iteration,
+                                         init_transform)
+        if self.backend == 'small_gicp':
+            return self._gicp(source, target, max_distance, max_iteration, init_transform)
+
+        result = cph.registration.registration_icp(
+            source, target,
+            max_distance,
+            init_transform.astype(np.float32),
+            cph.registration.TransformationEstimationPointToPlane(),
+            cph.registration.ICPConvergenceCriteria(max_iteration=max_iteration)
+        )
+        return (np.asarray(result.transformation, dtype=np.float64),
+                result.fitness, result.inlier_rmse)
+
+    def _gicp(self, source, target, max_distance: float, max_iteration: int,
+              init_transform: np.ndarray) -> tuple:
+        """GICP via small_gicp against a point cloud or Gaussian voxel map."""
+        result = small_gicp.align(
+            target, source,
+            init_T_target_source=init_transform,
+            max_correspondence_distance=max_distance,
+            max_iterations=max_iteration,
+            num_threads=self.n_workers,
+        )
+        n_inliers = max(result.num_inliers, 1)
+        fitness = result.num_inliers / max(source.size(), 1)
+        # GICP reports a Mahalanobis error; report its per-inlier RMS
+        rmse = float(np.sqrt(result.error / n_inliers))
+        return np.asarray(result.T_target_source), fitness, rmse
+
+    def _subsample(self, points: np.ndarray) -> np.ndarray:
+        """Stride-subsample to roughly window_max_points, as contiguous float32."""
+        step = max(1, len(points) // self.window_max_points)
+        return np.ascontiguousarray(points[::step], dtype=np.float32)
+
+    def _window_points(self) -> np.ndarray:
+        """Concatenate the window into a reused buffer, grown only when needed."""
+        total = sum(len(c) for c in self._window)
+        if len(self._window_buf) < total:
+            self._window_buf = np.empty((total, 3), dtype=np.float32)
+        return np.concatenate(self._window, out=self._window_buf[:total])
+
+    def _reset_window(self, window_size: int):
+        """Start an empty local-map window holding at most window_size frames."""
+        self._window = deque(maxlen=window_size)
+        self._window_pre = deque(maxlen=window_size)
+        if self.backend == 'small_gicp':
+            self._voxelmap = small_gicp.GaussianVoxelMap(self.gicp_voxel_resolution)
+
+    def _push_window(self, points_world: np.ndarray):
+        """Add a frame to the window; older frames fall off the far end."""
+        strided = self._subsample(points_world)
+        self._window.append(strided)
+        if self.backend == 'small_gicp':
+            self._voxelmap.insert(self.preprocess(strided))
+        elif self._use_open3d:
+            pcd = self.preprocess(strided)
+            self._window_pre.append((pcd.point.positions.cpu().numpy(),
+                                     pcd.point.normals.cpu().numpy()))
+
+    def _window_target(self):
+        """ICP target over the window, assembled from per-frame preprocessed chunks."""
+        if self.backend == 'cuda':
+            return self.preprocess(self._window_points())
+        if self.backend == 'small_gicp':
+            return self._voxelmap
+
+        points = np.concatenate([p for p, _ in self._window_pre])
+        normals = np.concatenate([n for _, n in self._window_pre])
+        target = o3d.t.geometry.PointCloud(o3d.core.Tensor.from_numpy(points)).to(self.device)
+        target.point.normals = o3d.core.Tensor.from_numpy(normals).to(self.device)
+        return target
+
+    def _multi_scale_icp(self, source: 'o3d.t.geometry.PointCloud',
+                         target: 'o3d.t.geometry.PointCloud',
+                         max_distance: float, max_iteration: int,
+                         init_transform: np.ndarray) -> tuple:
+        """Coarse-to-fine point-to-plane ICP; returns (transformation, fitness, rmse)."""
+        reg = o3d.t.pipelines.registration
+        v = self.voxel_size
+        if v > 0:
+            # Clouds are already voxelized at the finest scale (-1 skips downsampling)
+            voxel_sizes = o3d.utility.DoubleVector([4 * v, 2 * v, -1.0])
+            distances = o3d.utility.DoubleVector([4 * max_distance, 2 * max_distance, max_distance])
+            criteria = [
+                reg.ICPConvergenceCriteria(max_iteration=max(1, max_iteration // 4)),
+                reg.ICPConvergenceCriteria(max_iteration=max(1, max_iteration // 4)),
+                reg.ICPConvergenceCriteria(max_iteration=max_iteration),
+            ]
+        else:
+            voxel_sizes = o3d.utility.DoubleVector([-1.0])
+            distances = o3d.utility.DoubleVector([max_distance])
+            criteria = [reg.ICPConvergenceCriteria(max_iteration=max_iteration)]
+
+        result = reg.multi_scale_icp(
+            source, target,
+            voxel_sizes,
+            criteria,
+            distances,
+            o3d.core.Tensor(init_transform, o3d.core.float64),
+            reg.TransformationEstimationPointToPlane()
+        )
+        return result.transformation.cpu().numpy(), result.fitness, result.inlier_rmse
+
+    def register_pair(self, source, target,
                       init_transform: np.ndarray = None) -> tuple:
         """
         Register source to target point cloud.
@@ -66,27 +245,38 @@ class SimpleICPOdometry:
         if init_transform is None:
             init_transform = np.eye(4)
 
-        # Run ICP
-        result = o3d.pipelines.registration.registration_icp(
-            source, target,
-            self.max_correspondence,
-            init_transform,
-            o3d.pipelines.registration.TransformationEstimationPointToPlane(),
-            o3d.pipelines.registration.ICPConvergenceCriteria(
-                max_iteration=self.max_iteration
-            )
-        )
+        return self._register(source, target, self.max_correspondence,
+                              self.max_iteration, init_transform)
 
-        return result.transformation, result.fitness, result.inlier_rmse
+    def register_pairs(self, pairs: List[tuple]) -> List[tuple]:
+        """
+        Register independent (source, target[, init_transform]) pairs.
 
-    def run_on_sequence(self, point_clouds: List[np.ndarray],
+        Open3D releases the GIL inside ICP, so pairs run concurrently on a
+        thread pool. The cupoch backend already saturates the GPU from its
+        own stream and small_gicp parallelizes internally, so both run
+        pairs sequentially.
+
+        Returns:
+            List of (transformation, fitness, rmse), in input order
+        """
+        if not self._use_open3d or self.n_workers <= 1 or len(pairs) <= 1:
+            return [self.register_pair(*pair) for pair in pairs]
+
+        with ThreadPoolExecutor(max_workers=min(self.n_workers, len(pairs))) as executor:
+            return list(executor.map(lambda pair: self.register_pair(*pair), pairs))
+
+    def run_on_sequence(self, point_clouds: Iterable[np.ndarray],
                         verbose: bool = True, use_local_map: bool = True,
                         window_size: int = 5) -> np.ndarray:
         """
         Run ICP odometry on sequence using local map for robustness.
 
+        Frames are consumed one at a time, so a generator keeps memory bounded
+        by the window rather than the sequence length.
+
         Args:
-            point_clouds: List of Nx3 point clouds
+            point_clouds: Iterable of Nx3 point clouds
             verbose: Print progress
             use_local_map: Use sliding window local map instead of frame-to-frame
             window_size: Number of frames to include in local map
@@ -94,73 +284,46 @@ class SimpleICPOdometry:
         Returns:
             Nx4x4 array of absolute poses
         """
-        n_frames = len(point_clouds)
-        if n_frames == 0:
+        n_frames = len(point_clouds) if hasattr(point_clouds, '__len__') else '?'
+        frames = iter(point_clouds)
+        first = next(frames, None)
+        if first is None:
             return np.array([])
 
         # Initialize poses
         poses = [np.eye(4)]  # First pose is identity
 
-        # Keep track of processed point clouds in world frame
-        world_clouds = [point_clouds[0].copy()]
-
-        for i in range(1, n_frames):
-            # Build local map from recent frames (transformed to world frame)
-            start_idx = max(0, i - window_size)
+        self._reset_window(window_size)
+        prev_world = np.asarray(first, dtype=np.float32)
+        self._push_window(prev_world)
+        del first
 
+        for i, points in enumerate(frames, start=1):
             if use_local_map and i > 1:
-                # Combine recent point clouds into local map
-                local_map_points = []
-                for j in range(start_idx, i):
-                    # Transform points from frame j to world frame
-                    pts_world = world_clouds[j]
-                    # Subsample to avoid too many points
-                    step = max(1, len(pts_world) // 5000)
-                    local_map_points.append(pts_world[::step])
-                local_map_points = np.vstack(local_map_points)
-
-                # Create target point cloud
-                target_pcd = self.preprocess(local_map_points)
+                # Create target point cloud from the recent frames
+                target_pcd = self._window_target()
             else:
                 # Frame-to-frame for first few frames
-                target_pcd = self.preprocess(world_clouds[i-1])
+                target_pcd = self.preprocess(prev_world)
 
             # Current frame in sensor coordinates
-            curr_pcd = self.preprocess(point_clouds[i])
-
-            # Use previous pose as initial guess for current pose
-            init_transform = poses[-1].copy()
-
-            # Transform current frame to world for registration
-            # We register curr (in world frame estimate) to local map (in world)
-            curr_world_estimate = o3d.geometry.PointCloud()
-            curr_pts = np.asarray(curr_pcd.points)
-            # Apply estimated pose to get world coordinates
-            curr_world = (poses[-1][:3, :3] @ curr_pts.T).T + poses[-1][:3, 3]
-            curr_world_estimate.points = o3d.utility.Vector3dVector(curr_world)
-            curr_world_estimate.estimate_normals(
-                search_param=o3d.geometry.KDTreeSearchParamHybrid(
-                    radius=self.voxel_size * 2, max_nn=30
-                )
-            )
+            curr_pcd = self.preprocess(points)
+
+            # Constant-velocity prediction in SE(3) as the initial guess
+            if len(poses) >= 2:
+                T_guess = poses[-1] @ (np.linalg.inv(poses[-2]) @ poses[-1])
+            else:
+                T_guess = poses[-1]
 
-            # Register with relaxed parameters for robustness
-            result = o3d.pipelines.registration.registration_icp(
-                curr_world_estimate, target_pcd,
+            # Register the sensor-frame scan straight to the world-frame local
+            # map; the result is the absolute pose
+            T_abs, fitness, _ = self._register(
+                curr_pcd, target_pcd,
                 self.max_correspondence * 2,  # Larger threshold for robustness
-                np.eye(4),  # Already in world frame
-                o3d.pipelines.registration.TransformationEstimationPointToPlane(),
-                o3d.pipelines.registration.ICPConvergenceCriteria(
-                    max_iteration=self.max_iteration * 2
-                )
+                self.max_iteration,
+                T_guess,
             )
 
-            fitness = result.fitness
-            T_correction = result.transformation
-
-            # Apply correction to estimated pose
-            T_abs = T_correction @ poses[-1]
-
             # Validate: check if pose changed too much (potential ICP failure)
             delta_pos = np.linalg.norm(T_abs[:3, 3] - poses[-1][:3, 3])
             expected_motion = 0.25  # Approximate motion per frame
@@ -179,10 +342,9 @@ class SimpleICPOdometry:
 
             poses.append(T_abs)
 
-            # Store transformed points for local map
-            curr_pts_orig = np.asarray(point_clouds[i])
-            curr_world_final = (T_abs[:3, :3] @ curr_pts_orig.T).T + T_abs[:3, 3]
-            world_clouds.append(curr_world_final)
+            # Store transformed points for local map (one float32 transform per frame)
+            prev_world = transform_points(np.ascontiguousarray(points, dtype=np.float32), T_abs)
+            self._push_window(prev_world)
 
             if verbose and i % 5 == 0:
                 pos = T_abs[:3, 3]
@@ -204,9 +366,9 @@ def run_simple_icp(data_dir: str, config: dict = None) -> np.ndarray:
     """
     from .pcd_loader import PCDLoader
 
-    # Load point clouds
+    # Stream point clouds so only the local-map window stays in memory
     loader = PCDLoader(data_dir, config)
-    _, point_clouds = loader.load_sequence(preprocess=True)
+    point_clouds = (points for _, points in loader.iter_sequence_prefetched(preprocess=True))
 
     # Run ICP
     icp = SimpleICPOdometry(config)
@@ -7,7 +7,7 @@ the vehicle-path-following example.
 """
 
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Union
 import numpy as np
 
 
@@ -32,22 +32,25 @@ class WaypointExtractor:
         self.simplify_tolerance = config.get('simplify_tolerance', 0.1)
         self.z_threshold = config.get('z_threshold', None)
 
-    def extract(self, poses: Dict[int, np.ndarray]) -> List[Tuple[float, float]]:
+    def extract(self, poses: Union[Dict[int, np.ndarray], np.ndarray]) -> List[Tuple[float, float]]:
         """
         Extract 2D waypoints from poses.
 
         Args:
-            poses: Dictionary of pose ID to 4x4 transformation matrix
+            poses: Dictionary of pose ID to 4x4 transformation matrix, or an
+                   Nx4x4 array of poses in sequence order
 
         Returns:
             List of (x, y) waypoint tuples
         """
-        if not poses:
+        if len(poses) == 0:
             return []
 
         # Extract positions in sorted order
-        sorted_ids = sorted(poses.keys())
-        positions = np.array([poses[i][:3, 3] for i in sorted_ids])
+        if isinstance(poses, np.ndarray) and poses.ndim == 3:
+            positions = poses[:, :3, 3]
+        else:
+            positions = np.stack([poses[i][:3, 3] for i in sorted(poses)])
 
         # Filter by minimum distance
         waypoints_3d = self._filter_by_distance(positions)
@@ -67,17 +70,7 @@ class WaypointExtractor:
 
     def _filter_by_distance(self, positions: np.ndarray) -> np.ndarray:
         """Filter positions by minimum distance."""
-        if len(positions) == 0:
-            return positions
-
-        filtered = [positions[0]]
-
-        for pos in positions[1:]:
-            dist = np.linalg.norm(pos[:2] - filtered[-1][:2])
-            if dist >= self.min_distance:
-                filtered.append(pos)
-
-        return np.array(filtered)
+        return positions[min_distance_indices(positions[:, :2], self.min_distance)]
 
     def _filter_by_z(self, positions: np.ndarray) -> np.ndarray:
         """Filter out positions with large Z changes (non-ground)."""
@@ -103,45 +96,47 @@ class WaypointExtractor:
 
         return positions[indices]
 
-    def _douglas_peucker(self, points: np.ndarray, tolerance: float) -> List[int]:
+    def _douglas_peucker(self, points: np.ndarray, tolerance: float) -> np.ndarray:
         """
         Douglas-Peucker line simplification algorithm.
 
+        Iterative worklist of (lo, hi) segments with vectorized
+        perpendicular distances, so long trajectories neither recurse nor
+        loop per point in Python.
+
         Returns indices of points to keep.
         """
-        if len(points) < 3:
-            return list(range(len(points)))
-
-        # Find point with maximum distance from line between first and last
-        start, end = points[0], points[-1]
-        line_vec = end - start
-        line_len = np.linalg.norm(line_vec)
-
-        if line_len < 1e-6:
-            return [0, len(points) - 1]
-
-        line_unit = line_vec / line_len
-
-        # Distance from each point to line
-        distances = []
-        for i, p in enumerate(points):
-            v = p - start
-            proj_len = np.dot(v, line_unit)
-            proj = start + proj_len * line_unit
-            dist = np.linalg.norm(p - proj)
-            distances.append(dist)
-
-        max_dist = max(distances)
-        max_idx = distances.index(max_dist)
-
-        if max_dist > tolerance:
-            # Recursively simplify
-            left = self._douglas_peucker(points[:max_idx + 1], tolerance)
-            right = self._douglas_peucker(points[max_idx:], tolerance)
-            # Combine, avoiding duplicate at max_idx
-            return left[:-1] + [i + max_idx for i in right]
-        else:
-            return [0, len(points) - 1]
+        n = len(points)
+        if n < 3:
+            return np.arange(n)
+
+        keep = np.zeros(n, dtype=bool)
+        keep[[0, n - 1]] = True
+        stack = [(0, n - 1)]
+
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo < 2:
+                continue
+
+            a, b = points[lo], points[hi]
+            dx, dy = b[0] - a[0], b[1] - a[1]
+            line_len = np.hypot(dx, dy)
+            if line_len < 1e-6:
+                # Closed segment (e.g. a loop): keep only its endpoints
+                continue
+
+            inner = points[lo + 1:hi]
+            d = np.abs((inner[:, 0] - a[0]) * dy - (inner[:, 1] - a[1]) * dx) / line_len
+            j = int(d.argmax())
+
+            if d[j] > tolerance:
+                k = lo + 1 + j
+                keep[k] = True
+                stack.append((lo, k))
+                stack.append((k, hi))
+
+        return np.flatnonzero(keep)
 
     def save_waypoints(self, waypoints: List[Tuple[float, float]], output_path: str,
                        header: str = None):
@@ -192,6 +187,37 @@ class WaypointExtractor:
         }
 
 
+def min_distance_indices(xy: np.ndarray, min_distance: float) -> np.ndarray:
+    """
+    Greedy minimum-spacing selection over (N, 2) positions.
+
+    Keeps the first position, then each position at least min_distance
+    (Euclidean, XY) from the last kept one. Distances to the current anchor
+    are evaluated a block at a time, so the Python loop runs once per kept
+    waypoint rather than once per pose.
+
+    Returns indices of positions to keep.
+    """
+    n = len(xy)
+    if n == 0:
+        return np.zeros(0, dtype=np.intp)
+
+    indices = [0]
+    anchor, start, block = 0, 1, 64
+    while start < n:
+        stop = min(n, start + block)
+        d = xy[start:stop] - xy[anchor]
+        far = np.flatnonzero(np.hypot(d[:, 0], d[:, 1]) >= min_distance)
+        if len(far):
+            anchor = start + int(far[0])
+            indices.append(anchor)
+            start, block = anchor + 1, 64
+        else:
+            start, block = stop, block * 2
+
+    return np.asarray(indices, dtype=np.intp)
+
+
 def save_trajectory(poses: Dict[int, np.ndarray], output_path: str):
     """
     Save full trajectory (3D poses) to file.
@@ -201,50 +227,68 @@ def save_trajectory(poses: Dict[int, np.ndarray], output_path: str):
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
+    sorted_ids = sorted(poses.keys())
+    if sorted_ids:
+        mats = np.stack([poses[i] for i in sorted_ids])
+        rows = np.empty((len(sorted_ids), 8))
+        rows[:, 0] = sorted_ids
+        rows[:, 1:4] = mats[:, :3, 3]
+        rows[:, 4:] = rotation_matrices_to_quaternions(mats[:, :3, :3])
+
     with open(output_path, 'w') as f:
         f.write("# Trajectory from mapping\n")
         f.write("# Format: id x y z qx qy qz qw\n\n")
 
-        for pose_id in sorted(poses.keys()):
-            pose = poses[pose_id]
-            t = pose[:3, 3]
+        if sorted_ids:
+            np.savetxt(f, rows, fmt=['%d'] + ['%.6f'] * 7)
 
-            # Convert rotation matrix to quaternion
-            R = pose[:3, :3]
-            q = rotation_matrix_to_quaternion(R)
 
-            f.write(f"{pose_id} {t[0]:.6f} {t[1]:.6f} {t[2]:.6f} "
-                    f"{q[0]:.6f} {q[1]:.6f} {q[2]:.6f} {q[3]:.6f}\n")
+def rotation_matrices_to_quaternions(Rs: np.ndarray) -> np.ndarray:
+    """Convert (N, 3, 3) rotation matrices to (N, 4) quaternions [x, y, z, w]."""
+    # Algorithm from: https://www.euclideanspace.com/maths/geometry/rotations/conversions/matrixToQuaternion/
+    Rs = np.asarray(Rs, dtype=np.float64)
+    trace = np.einsum('nii->n', Rs)
+    r00, r11, r22 = Rs[:, 0, 0], Rs[:, 1, 1], Rs[:, 2, 2]
+
+    # Same branch order as the scalar formulation
+    case_w = trace > 0
+    case_x = ~case_w & (r00 > r11) & (r00 > r22)
+    case_y = ~case_w & ~case_x & (r11 > r22)
+    case_z = ~(case_w | case_x | case_y)
+
+    q = np.empty((len(Rs), 4))
+
+    R = Rs[case_w]
+    s = 0.5 / np.sqrt(np.einsum('nii->n', R) + 1.0)
+    q[case_w] = np.stack([(R[:, 2, 1] - R[:, 1, 2]) * s,
+                          (R[:, 0, 2] - R[:, 2, 0]) * s,
+                          (R[:, 1, 0] - R[:, 0, 1]) * s,
+                          0.25 / s], axis=1)
+
+    R = Rs[case_x]
+    s = 2.0 * np.sqrt(1.0 + R[:, 0, 0] - R[:, 1, 1] - R[:, 2, 2])
+    q[case_x] = np.stack([0.25 * s,
+                          (R[:, 0, 1] + R[:, 1, 0]) / s,
+                          (R[:, 0, 2] + R[:, 2, 0]) / s,
+                          (R[:, 2, 1] - R[:, 1, 2]) / s], axis=1)
+
+    R = Rs[case_y]
+    s = 2.0 * np.sqrt(1.0 + R[:, 1, 1] - R[:, 0, 0] - R[:, 2, 2])
+    q[case_y] = np.stack([(R[:, 0, 1] + R[:, 1, 0]) / s,
+                          0.25 * s,
+                          (R[:, 1, 2] + R[:, 2, 1]) / s,
+                          (R[:, 0, 2] - R[:, 2, 0]) / s], axis=1)
+
+    R = Rs[case_z]
+    s = 2.0 * np.sqrt(1.0 + R[:, 2, 2] - R[:, 0, 0] - R[:, 1, 1])
+    q[case_z] = np.stack([(R[:, 0, 2] + R[:, 2, 0]) / s,
+                          (R[:, 1, 2] + R[:, 2, 1]) / s,
+                          0.25 * s,
+                          (R[:, 1, 0] - R[:, 0, 1]) / s], axis=1)
+
+    return q
 
 
 def rotation_matrix_to_quaternion(R: np.ndarray) -> np.ndarray:
     """Convert 3x3 rotation matrix to quaternion [x, y, z, w]."""
-    # Algorithm from: https://www.euclideanspace.com/maths/geometry/rotations/conversions/matrixToQuaternion/
-    trace = np.trace(R)
-
-    if trace > 0:
-        s = 0.5 / np.sqrt(trace + 1.0)
-        w = 0.25 / s
-        x = (R[2, 1] - R[1, 2]) * s
-        y = (R[0, 2] - R[2, 0]) * s
-        z = (R[1, 0] - R[0, 1]) * s
-    elif R[0, 0] > R[1, 1] and R[0, 0] > R[2, 2]:
-        s = 2.0 * np.sqrt(1.0 + R[0, 0] - R[1, 1] - R[2, 2])
-        w = (R[2, 1] - R[1, 2]) / s
-        x = 0.25 * s
-        y = (R[0, 1] + R[1, 0]) / s
-        z = (R[0, 2] + R[2, 0]) / s
-    elif R[1, 1] > R[2, 2]:
-        s = 2.0 * np.sqrt(1.0 + R[1, 1] - R[0, 0] - R[2, 2])
-        w = (R[0, 2] - R[2, 0]) / s
-        x = (R[0, 1] + R[1, 0]) / s
-        y = 0.25 * s
-        z = (R[1, 2] + R[2, 1]) / s
-    else:
-        s = 2.0 * np.sqrt(1.0 + R[2, 2] - R[0, 0] - R[1, 1])
-        w = (R[1, 0] - R[0, 1]) / s
-        x = (R[0, 2] + R[2, 0]) / s
-        y = (R[1, 2] + R[2, 1]) / s
-        z = 0.25 * s
-
-    return np.array([x, y, z, w])
+    return rotation_matrices_to_quaternions(np.asarray(R)[None])[0]
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""Tests for the shared mapping helpers."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.common import transform_points, voxel_downsample_np  # noqa: E402
+
+POINTS = np.array([
+    [0.1, 0.1, 0.1], [0.3, 0.1, 0.1], [1.2, 0.1, 0.1], [1.4, 0.5, 0.1],
+], dtype=np.float32)
+
+
+def test_voxel_downsample_centroids():
+    out = voxel_downsample_np(POINTS, 1.0)
+    np.testing.assert_allclose(out, [[0.2, 0.1, 0.1], [1.3, 0.3, 0.1]], rtol=1e-6)
+
+
+def test_voxel_downsample_representative_keeps_first_point():
+    out = voxel_downsample_np(POINTS, 1.0, representative=True)
+    np.testing.assert_array_equal(out, POINTS[[0, 2]])
+
+
+def test_transform_points():
+    pose = np.eye(4)
+    pose[:3, :3] = [[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]
+    pose[:3, 3] = [1.0, 2.0, 3.0]
+    np.testing.assert_allclose(transform_points(POINTS, pose), POINTS @ pose[:3, :3].T + pose[:3, 3],
+                               rtol=1e-6)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Tests for Scan Context descriptors and matching."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.loop_detector import ScanContextDetector  # noqa: E402
+
+
+def _brute_force_similarity(desc1: np.ndarray, desc2: np.ndarray) -> float:
+    """Best cosine similarity over every column shift of desc2."""
+    norm = np.linalg.norm(desc1) * np.linalg.norm(desc2)
+    if norm == 0:
+        return 0.0
+    best = max(np.sum(desc1 * np.roll(desc2, shift, axis=1)) for shift in range(desc2.shape[1]))
+    return max(best / norm, 0.0)
+
+
+def _scan(rng, n=5000):
+    points = rng.uniform(-60.0, 60.0, size=(n, 3))
+    points[:, 2] = rng.uniform(-2.0, 6.0, size=n)
+    return points
+
+
+def test_find_matches_equals_brute_force():
+    rng = np.random.default_rng(0)
+    detector = ScanContextDetector({'similarity_threshold': 0.0})
+    for frame_id in range(8):
+        detector.add_frame(frame_id * 10, _scan(rng))
+
+    matches = dict(detector.find_matches(0, min_gap=20))
+    assert sorted(matches) == [20, 30, 40, 50, 60, 70]
+    query = detector.descriptors[0]
+    for frame_id, sim in matches.items():
+        expected = _brute_force_similarity(query, detector.descriptors[frame_id])
+        assert abs(sim - expected) < 1e-4
+
+
+def test_find_matches_is_rotation_invariant():
+    rng = np.random.default_rng(1)
+    points = _scan(rng)
+    angle = 2 * np.pi * 7 / 60  # Whole sectors, so bins map exactly
+    c, s = np.cos(angle), np.sin(angle)
+    rotated = points @ np.array([[c, -s, 0.0], [s, c, 0.0], [0.0, 0.0, 1.0]]).T
+
+    detector = ScanContextDetector({'similarity_threshold': 0.0})
+    detector.add_frame(0, points)
+    detector.add_frame(100, rotated)
+    detector.add_frame(200, _scan(rng))
+
+    matches = detector.find_matches(0, min_gap=50)
+    assert matches[0][0] == 100
+    assert matches[0][1] > 0.95
+
+
+def test_descriptor_kernel_matches_numpy_path():
+    rng = np.random.default_rng(2)
+    points = _scan(rng).astype(np.float32)
+    detector = ScanContextDetector()
+    kernel_desc = detector.compute_descriptor(points)
+
+    detector._use_kernel = False
+    np.testing.assert_allclose(kernel_desc, detector.compute_descriptor(points))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Tests for waypoint spacing, simplification and trajectory export."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.waypoint_extractor import (  # noqa: E402
+    WaypointExtractor, min_distance_indices, rotation_matrices_to_quaternions,
+)
+
+
+def _greedy_reference(xy: np.ndarray, min_distance: float) -> list:
+    """Per-pose loop the vectorized selection must reproduce."""
+    kept = [0]
+    for i in range(1, len(xy)):
+        if np.linalg.norm(xy[i] - xy[kept[-1]]) >= min_distance:
+            kept.append(i)
+    return kept
+
+
+def test_min_distance_indices_small_trajectory():
+    xy = np.array([
+        [0.0, 0.0], [0.3, 0.0], [0.6, 0.0], [0.9, 0.0],
+        [0.9, 0.45], [0.9, 0.9], [1.2, 0.9], [1.5, 0.9],
+    ])
+    assert min_distance_indices(xy, 0.5).tolist() == [0, 2, 4, 6]
+
+
+def test_min_distance_indices_matches_greedy_loop():
+    rng = np.random.default_rng(0)
+    xy = np.cumsum(rng.normal(0.0, 0.2, size=(2000, 2)), axis=0)
+    for min_distance in (0.0, 0.1, 0.5, 3.0):
+        assert min_distance_indices(xy, min_distance).tolist() == _greedy_reference(xy, min_distance)
+
+
+def test_min_distance_indices_empty():
+    assert len(min_distance_indices(np.zeros((0, 2)), 0.5)) == 0
+
+
+def test_filter_by_distance_uses_xy_only():
+    extractor = WaypointExtractor({'min_distance': 0.5, 'simplify': False})
+    positions = np.array([[0.0, 0.0, 0.0], [0.1, 0.0, 5.0], [0.5, 0.0, 0.0], [0.7, 0.0, 0.0]])
+    np.testing.assert_array_equal(extractor._filter_by_distance(positions), positions[[0, 2]])
+
+
+def test_douglas_peucker_keeps_corners():
+    extractor = WaypointExtractor({'simplify_tolerance': 0.1})
+    x = np.linspace(0.0, 4.0, 9)
+    points = np.vstack([np.column_stack([x, np.zeros_like(x)]),
+                        np.column_stack([np.full(8, 4.0), x[1:]])])
+    assert extractor._douglas_peucker(points, 0.1).tolist() == [0, 8, 16]
+
+
+def test_douglas_peucker_closed_loop_keeps_endpoints():
+    # A segment whose endpoints coincide is not split
+    extractor = WaypointExtractor({'simplify_tolerance': 0.1})
+    t = np.linspace(0.0, 2 * np.pi, 50)
+    loop = np.column_stack([np.cos(t), np.sin(t)])
+    loop[-1] = loop[0]
+    assert extractor._douglas_peucker(loop, 0.1).tolist() == [0, 49]
+
+
+def test_rotation_matrices_to_quaternions_round_trip():
+    Rotation = pytest.importorskip("scipy.spatial.transform").Rotation
+    rots = Rotation.from_rotvec(np.vstack([
+        np.random.default_rng(3).normal(size=(50, 3)),
+        np.pi * np.eye(3),  # 180 degree turns exercise the non-trace branches
+    ]))
+    q = rotation_matrices_to_quaternions(rots.as_matrix())
+    # q and -q are the same rotation
+    assert np.allclose(np.abs(np.einsum('ij,ij->i', q, rots.as_quat())), 1.0)
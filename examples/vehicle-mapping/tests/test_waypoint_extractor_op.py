@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Tests for the waypoint extractor DORA operator."""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("dora")
+pa = pytest.importorskip("pyarrow")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'operators'))
+import waypoint_extractor_op  # noqa: E402
+from src.waypoint_extractor import WaypointExtractor  # noqa: E402
+
+XY = np.array([
+    [0.0, 0.0], [0.3, 0.0], [0.6, 0.0], [0.9, 0.0],
+    [0.9, 0.45], [0.9, 0.9], [1.2, 0.9], [1.5, 0.9],
+])
+
+
+@pytest.fixture
+def operator(tmp_path, monkeypatch):
+    monkeypatch.setenv('MAP_OUTPUT_DIR', str(tmp_path))
+    op = waypoint_extractor_op.Operator()
+    for x, y in XY:
+        pose = np.eye(4, dtype=np.float32)
+        pose[0, 3], pose[1, 3] = x, y
+        event = {"type": "INPUT", "id": "pose", "value": pa.array(pose.ravel()), "metadata": {}}
+        op.on_event(event, None)
+    return op
+
+
+def test_min_spacing_waypoints(operator):
+    operator.simplify = False
+    operator.min_spacing = 0.5
+    # Same greedy spacing as WaypointExtractor, plus the final pose
+    expected = XY[[0, 2, 4, 6, 7]]
+    np.testing.assert_allclose(operator._extract_waypoints(), expected)
+
+
+@pytest.mark.parametrize("max_waypoints", [None, 1000])
+def test_douglas_peucker_matches_library(operator, max_waypoints):
+    # An uncapped heap split keeps the same vertices as the compiled path
+    rng = np.random.default_rng(1)
+    points = np.cumsum(rng.normal(0.0, 0.5, size=(300, 2)), axis=0)
+    expected = points[WaypointExtractor()._douglas_peucker(points, 0.2)]
+    np.testing.assert_array_equal(operator._douglas_peucker(points, 0.2, max_waypoints), expected)
+
+
+@pytest.mark.parametrize("max_waypoints", [None, 100])
+def test_douglas_peucker_closed_loop_keeps_endpoints(operator, max_waypoints):
+    t = np.linspace(0.0, 2 * np.pi, 50)
+    loop = np.column_stack([np.cos(t), np.sin(t)])
+    loop[-1] = loop[0]
+    np.testing.assert_array_equal(operator._douglas_peucker(loop, 0.1, max_waypoints), loop[[0, -1]])
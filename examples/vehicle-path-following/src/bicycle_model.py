@@ -13,6 +13,7 @@ Inputs:
 Outputs:
     - sim_pose: Simulated vehicle pose [x, y, theta, velocity] (float32 array)
     - sim_state: Full vehicle state for debugging (float32 array)
+                 [x, y, theta, velocity, steering, accel, yaw_rate, cos_theta, sin_theta]
 """
 
 import math
@@ -20,9 +21,74 @@ import yaml
 import os
 from pathlib import Path
 
+import numpy as np
 import pyarrow as pa
 from dora import DoraStatus
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _make_step_core(dt, wheelbase, max_speed, min_speed, max_accel, max_decel,
+                    max_steering, max_steering_rate):
+    """
+    Build a step kernel with the vehicle parameters baked in as constants.
+
+    The returned step(state, cmds) advances the kinematic state in place.
+
+    state: [x, y, theta, velocity, steering_angle, cos_theta, sin_theta]
+    cmds:  [steering_cmd, throttle_cmd]
+    """
+    max_delta = max_steering_rate * dt
+    inv_wheelbase = 1.0 / wheelbase
+    two_pi = 2.0 * math.pi
+    inv_two_pi = 1.0 / two_pi
+
+    def step(state, cmds):
+        x, y, theta, velocity, steering_angle = state[0], state[1], state[2], state[3], state[4]
+
+        # Apply steering with rate limit
+        steering_delta = max(-max_delta, min(max_delta, cmds[0] - steering_angle))
+        steering_angle = max(-max_steering, min(max_steering, steering_angle + steering_delta))
+
+        # Apply throttle/brake to velocity
+        if cmds[1] >= 0:
+            accel = cmds[1] * max_accel
+        else:
+            accel = cmds[1] * max_decel
+        velocity = max(min_speed, min(max_speed, velocity + accel * dt))
+
+        # Bicycle model kinematics
+        if abs(steering_angle) > 1e-6:
+            angular_velocity = velocity * math.tan(steering_angle) * inv_wheelbase
+        else:
+            angular_velocity = 0.0
+
+        # Update pose, wrapping theta into [-pi, pi) without branches
+        theta += angular_velocity * dt
+        theta -= two_pi * math.floor((theta + math.pi) * inv_two_pi)
+
+        cos_theta = math.cos(theta)
+        sin_theta = math.sin(theta)
+        x += velocity * cos_theta * dt
+        y += velocity * sin_theta * dt
+
+        state[0] = x
+        state[1] = y
+        state[2] = theta
+        state[3] = velocity
+        state[4] = steering_angle
+        state[5] = cos_theta
+        state[6] = sin_theta
+
+    if NUMBA_AVAILABLE:
+        # Closure constants are frozen at compile time (closures can't be cached)
+        step = njit(fastmath=True)(step)
+    return step
+
 
 class BicycleModel:
     """Kinematic bicycle model for vehicle simulation."""
@@ -65,6 +131,18 @@ class BicycleModel:
         self.prev_velocity = 0.0
         self.prev_theta = 0.0
 
+        # Packed buffers and a step kernel specialized on the parameters
+        self._state = np.zeros(7, dtype=np.float64)
+        self._cmds = np.zeros(2, dtype=np.float64)
+        self._inv_dt = 1.0 / self.dt if self.dt > 0 else 0.0
+        self._step_core = _make_step_core(
+            self.dt, self.wheelbase, self.max_speed, self.min_speed, self.max_accel,
+            self.max_decel, self.max_steering, self.max_steering_rate,
+        )
+
+        # Warm up the JIT so the first tick doesn't pay for compilation
+        self._step_core(np.zeros(7), self._cmds)
+
     def set_initial_state(self, x: float, y: float, theta: float, velocity: float = 0.0):
         """Set initial vehicle state."""
         self.x = x
@@ -74,44 +152,36 @@ class BicycleModel:
         self.prev_velocity = velocity
         self.prev_theta = theta
 
-    def step(self) -> dict:
-        """Execute one simulation step."""
+    def _advance(self) -> tuple:
+        """Run the step kernel on the model state; returns (cos_theta, sin_theta)."""
         # Save previous state
         self.prev_velocity = self.velocity
         self.prev_theta = self.theta
 
-        # Apply steering with rate limit
-        steering_error = self.steering_cmd - self.steering_angle
-        max_delta = self.max_steering_rate * self.dt
-        steering_delta = max(-max_delta, min(max_delta, steering_error))
-        self.steering_angle += steering_delta
-        self.steering_angle = max(-self.max_steering, min(self.max_steering, self.steering_angle))
+        state = self._state
+        state[0] = self.x
+        state[1] = self.y
+        state[2] = self.theta
+        state[3] = self.velocity
+        state[4] = self.steering_angle
+        self._cmds[0] = self.steering_cmd
+        self._cmds[1] = self.throttle_cmd
 
-        # Apply throttle/brake to velocity
-        if self.throttle_cmd >= 0:
-            accel = self.throttle_cmd * self.max_accel
-        else:
-            accel = self.throttle_cmd * self.max_decel
+        self._step_core(state, self._cmds)
 
-        self.velocity += accel * self.dt
-        self.velocity = max(self.min_speed, min(self.max_speed, self.velocity))
+        (self.x, self.y, self.theta, self.velocity, self.steering_angle,
+         cos_theta, sin_theta) = state.tolist()
+        return cos_theta, sin_theta
 
-        # Bicycle model kinematics
-        if abs(self.steering_angle) > 1e-6:
-            turn_radius = self.wheelbase / math.tan(self.steering_angle)
-            angular_velocity = self.velocity / turn_radius
-        else:
-            angular_velocity = 0.0
+    def _rates(self) -> tuple:
+        """Finite-difference (acceleration, yaw_rate) over the last step."""
+        return ((self.velocity - self.prev_velocity) * self._inv_dt,
+                (self.theta - self.prev_theta) * self._inv_dt)
 
-        # Update pose
-        self.theta += angular_velocity * self.dt
-        while self.theta > math.pi:
-            self.theta -= 2 * math.pi
-        while self.theta < -math.pi:
-            self.theta += 2 * math.pi
-
-        self.x += self.velocity * math.cos(self.theta) * self.dt
-        self.y += self.velocity * math.sin(self.theta) * self.dt
+    def step(self) -> dict:
+        """Execute one simulation step."""
+        cos_theta, sin_theta = self._advance()
+        acceleration, yaw_rate = self._rates()
 
         return {
             'x': self.x,
@@ -119,10 +189,24 @@ class BicycleModel:
             'theta': self.theta,
             'velocity': self.velocity,
             'steering_angle': self.steering_angle,
-            'acceleration': (self.velocity - self.prev_velocity) / self.dt if self.dt > 0 else 0.0,
-            'yaw_rate': (self.theta - self.prev_theta) / self.dt if self.dt > 0 else 0.0,
+            'acceleration': acceleration,
+            'yaw_rate': yaw_rate,
+            'cos_theta': cos_theta,
+            'sin_theta': sin_theta,
         }
 
+    def step_into(self, out: np.ndarray) -> np.ndarray:
+        """
+        Execute one simulation step, writing the state into out.
+
+        Layout: [x, y, theta, velocity, steering, accel, yaw_rate, cos_theta, sin_theta]
+        """
+        cos_theta, sin_theta = self._advance()
+        acceleration, yaw_rate = self._rates()
+        out[:] = (self.x, self.y, self.theta, self.velocity, self.steering_angle,
+                  acceleration, yaw_rate, cos_theta, sin_theta)
+        return out
+
 
 class Operator:
     """DORA Operator for Bicycle Model."""
@@ -148,6 +232,10 @@ class Operator:
                     velocity=init.get('velocity', 0.0)
                 )
 
+        # Persistent output buffer; sim_pose is a view of its first four slots
+        self._state_buf = np.empty(9, dtype=np.float32)
+        self._pose_buf = self._state_buf[:4]
+
         print(f"[BicycleModel] Initialized: wheelbase={self.model.wheelbase}m, max_speed={self.model.max_speed}m/s")
         print(f"[BicycleModel] Initial pose: ({self.model.x:.2f}, {self.model.y:.2f}, {math.degrees(self.model.theta):.1f}deg)")
 
@@ -156,36 +244,30 @@ class Operator:
             event_id = dora_event["id"]
 
             if event_id == "steering_cmd":
-                data = dora_event["value"].to_pylist()
-                if data:
+                data = dora_event["value"].to_numpy(zero_copy_only=False)
+                if len(data):
                     self.model.steering_cmd = float(data[0])
 
             elif event_id == "throttle_cmd":
-                data = dora_event["value"].to_pylist()
-                if data:
+                data = dora_event["value"].to_numpy(zero_copy_only=False)
+                if len(data):
                     self.model.throttle_cmd = float(data[0])
 
             elif event_id == "tick":
                 # Execute simulation step
-                state = self.model.step()
+                self.model.step_into(self._state_buf)
 
                 # Send pose output [x, y, theta, velocity]
-                pose_data = [state['x'], state['y'], state['theta'], state['velocity']]
                 send_output(
                     "sim_pose",
-                    pa.array(pose_data, type=pa.float32()),
+                    pa.array(self._pose_buf),
                     dora_event["metadata"]
                 )
 
                 # Send full state
-                state_data = [
-                    state['x'], state['y'], state['theta'],
-                    state['velocity'], state['steering_angle'],
-                    state['acceleration'], state['yaw_rate']
-                ]
                 send_output(
                     "sim_state",
-                    pa.array(state_data, type=pa.float32()),
+                    pa.array(self._state_buf),
                     dora_event["metadata"]
                 )
 
@@ -5,7 +5,8 @@ IMU Synthesizer for DORA Simulation
 Generates synthetic IMU data from vehicle state (pose and velocity).
 
 Inputs:
-    - sim_state: Vehicle state [x, y, theta, velocity, steering, accel, yaw_rate]
+    - sim_state: Vehicle state [x, y, theta, velocity, steering, accel, yaw_rate,
+                 cos_theta, sin_theta]
 
 Outputs:
     - imu_msg: Synthesized IMU message compatible with real IMU format
@@ -21,6 +22,32 @@ import pyarrow as pa
 from dora import DoraStatus
 
 
+def _make_body_accel(dt: float, gravity: float):
+    """
+    Build a body-frame acceleration kernel with dt and gravity baked in.
+
+    The returned function maps (velocity, cos_theta, sin_theta, prev_vx,
+    prev_vy) to (vx, vy, ax_body, ay_body, az_body).
+    """
+    inv_dt = 1.0 / dt if dt > 0 else 0.0
+
+    def body_accel(velocity, cos_theta, sin_theta, prev_vx, prev_vy):
+        # Velocity components in world frame
+        vx = velocity * cos_theta
+        vy = velocity * sin_theta
+
+        # Acceleration in world frame
+        ax_world = (vx - prev_vx) * inv_dt
+        ay_world = (vy - prev_vy) * inv_dt
+
+        # Transform to body frame
+        ax_body = ax_world * cos_theta + ay_world * sin_theta
+        ay_body = -ax_world * sin_theta + ay_world * cos_theta
+        return vx, vy, ax_body, ay_body, gravity
+
+    return body_accel
+
+
 class IMUSynthesizer:
     """Synthesize IMU data from vehicle motion."""
 
@@ -48,33 +75,59 @@ class IMUSynthesizer:
         self.prev_vx = 0.0
         self.prev_vy = 0.0
 
-    def synthesize(self, state: dict) -> dict:
-        """Synthesize IMU data from vehicle state."""
-        theta = state.get('theta', 0.0)
-        velocity = state.get('velocity', 0.0)
-        yaw_rate = state.get('yaw_rate', 0.0)
-
-        # Velocity components in world frame
-        vx = velocity * math.cos(theta)
-        vy = velocity * math.sin(theta)
-
-        # Acceleration in world frame
-        ax_world = (vx - self.prev_vx) / self.dt if self.dt > 0 else 0.0
-        ay_world = (vy - self.prev_vy) / self.dt if self.dt > 0 else 0.0
+        # Motion kernel specialized on the (fixed) simulation constants
+        self._body_accel = _make_body_accel(self.dt, self.gravity)
+
+        # Ring buffer of pre-scaled noise + bias: [ax, ay, az, gyro_z]
+        self._rng = np.random.default_rng()
+        self._noise_size = 8192
+        self._noise_scale = np.array([self.accel_noise_std] * 3 + [self.gyro_noise_std])
+        self._noise_offset = np.array([*self.accel_bias[:3], self.gyro_bias[2]], dtype=np.float64)
+        self._refill_noise()
+
+    def _refill_noise(self):
+        """Draw a fresh block of noise samples in a single RNG call."""
+        buf = self._rng.standard_normal((self._noise_size, 4))
+        buf *= self._noise_scale
+        buf += self._noise_offset
+        self._noise_buf = buf.tolist()
+        self._noise_idx = 0
+
+    def synthesize(self, state: np.ndarray) -> dict:
+        """
+        Synthesize IMU data from vehicle state.
+
+        Args:
+            state: sim_state slots [x, y, theta, velocity, steering, accel,
+                   yaw_rate] with optional trailing [cos_theta, sin_theta]
+        """
+        values = state.tolist()
+        theta = values[2]
+        velocity = values[3]
+        yaw_rate = values[6]
+
+        # Heading trig is computed once by the bicycle model
+        if len(values) >= 9:
+            cos_theta, sin_theta = values[7], values[8]
+        else:
+            cos_theta = math.cos(theta)
+            sin_theta = math.sin(theta)
 
-        # Transform to body frame
-        cos_theta = math.cos(theta)
-        sin_theta = math.sin(theta)
-        ax_body = ax_world * cos_theta + ay_world * sin_theta
-        ay_body = -ax_world * sin_theta + ay_world * cos_theta
-        az_body = self.gravity
+        # World velocity and body-frame acceleration
+        vx, vy, ax_body, ay_body, az_body = self._body_accel(
+            velocity, cos_theta, sin_theta, self.prev_vx, self.prev_vy)
 
         # Add noise
-        ax_noisy = ax_body + np.random.normal(0, self.accel_noise_std) + self.accel_bias[0]
-        ay_noisy = ay_body + np.random.normal(0, self.accel_noise_std) + self.accel_bias[1]
-        az_noisy = az_body + np.random.normal(0, self.accel_noise_std) + self.accel_bias[2]
+        if self._noise_idx >= self._noise_size:
+            self._refill_noise()
+        n_ax, n_ay, n_az, n_gz = self._noise_buf[self._noise_idx]
+        self._noise_idx += 1
+
+        ax_noisy = ax_body + n_ax
+        ay_noisy = ay_body + n_ay
+        az_noisy = az_body + n_az
 
-        yaw_rate_noisy = yaw_rate + np.random.normal(0, self.gyro_noise_std) + self.gyro_bias[2]
+        yaw_rate_noisy = yaw_rate + n_gz
 
         # Update history
         self.prev_vx = vx
@@ -107,20 +160,10 @@ class Operator:
             event_id = dora_event["id"]
 
             if event_id == "sim_state":
-                data = dora_event["value"].to_pylist()
+                data = dora_event["value"].to_numpy(zero_copy_only=False)
 
                 if len(data) >= 7:
-                    state = {
-                        'x': data[0],
-                        'y': data[1],
-                        'theta': data[2],
-                        'velocity': data[3],
-                        'steering_angle': data[4],
-                        'acceleration': data[5],
-                        'yaw_rate': data[6],
-                    }
-
-                    imu_data = self.synthesizer.synthesize(state)
+                    imu_data = self.synthesizer.synthesize(data)
 
                     imu_array = [
                         imu_data['roll'], imu_data['pitch'], imu_data['yaw'],
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the path-following simulation operators.
+
+Each operator adds this directory to sys.path and imports from here, so
+config and waypoint parsing live in one place.
+"""
+
+import functools
+import os
+import warnings
+
+import numpy as np
+import yaml
+
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_yaml(path: str, mtime: float) -> dict:
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=_YamlLoader) or {}
+
+
+def load_yaml(path) -> dict:
+    """Parse a YAML file with the C loader when available, cached per mtime."""
+    path = str(path)
+    return _parse_yaml(path, os.stat(path).st_mtime)
+
+
+@functools.lru_cache(maxsize=8)
+def _read_waypoints(path: str, mtime: float) -> np.ndarray:
+    with warnings.catch_warnings():
+        # A file with only comments is an empty path, not an error
+        warnings.simplefilter("ignore", UserWarning)
+        xy = np.loadtxt(path, comments='#', dtype=np.float32, ndmin=2, usecols=(0, 1))
+    xy = xy.reshape(-1, 2)
+    xy.flags.writeable = False
+    return xy
+
+
+def read_waypoints(path) -> np.ndarray:
+    """
+    Read (N, 2) float32 waypoints from an "x y" text file.
+
+    Lines starting with '#' are skipped and extra columns are ignored.
+    Results are cached per (path, mtime); the returned array is shared
+    and read-only.
+    """
+    path = str(path)
+    return _read_waypoints(path, os.stat(path).st_mtime)
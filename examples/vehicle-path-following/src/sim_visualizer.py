@@ -14,15 +14,17 @@ Inputs:
 """
 
 import math
-import yaml
 import os
+import sys
 from pathlib import Path
-from collections import deque
 
 import numpy as np
 import rerun as rr
 from dora import DoraStatus
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from sim_utils import load_yaml, read_waypoints  # noqa: E402
+
 
 class SimulationVisualizer:
     """Rerun-based visualization for simulation."""
@@ -30,9 +32,8 @@ class SimulationVisualizer:
     def __init__(self, config_path: str = None):
         # Load configuration
         if config_path and os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                viz_config = config.get('visualization', {})
+            config = load_yaml(config_path)
+            viz_config = config.get('visualization', {})
         else:
             viz_config = {}
 
@@ -41,9 +42,43 @@ class SimulationVisualizer:
         self.vehicle_width = viz_config.get('vehicle_width', 0.4)
         self.vehicle_height = viz_config.get('vehicle_height', 0.3)
 
-        # Trail settings
+        # Trail settings: float32 ring buffer written twice (at i and
+        # i + trail_length) so the newest trail_length points are always
+        # one contiguous slice, with no per-frame copy or np.roll
         self.trail_length = viz_config.get('trail_length', 200)
-        self.trail = deque(maxlen=self.trail_length)
+        self._trail_buf = np.zeros((2 * self.trail_length, 3), dtype=np.float32)
+        self._trail_head = 0
+        self._trail_fill = 0
+
+        # Re-log the trail and heading arrow only every Nth pose; the
+        # viewer renders at ~60 Hz so intermediate strips are never seen
+        self.trail_log_every = max(1, int(viz_config.get('trail_log_every', 5)))
+        self.arrow_log_every = max(1, int(viz_config.get('arrow_log_every', 5)))
+        self._frame = 0
+
+        # Constant box geometry
+        self._half_sizes = np.array(
+            [[self.vehicle_length / 2, self.vehicle_width / 2, self.vehicle_height / 2]],
+            dtype=np.float32)
+        self._center = np.array([[0.0, 0.0, self.vehicle_height / 2]], dtype=np.float32)
+        self._arrow_origin = np.array([[0.0, 0.0, self.vehicle_height]], dtype=np.float32)
+        self._arrow_vector = np.zeros((1, 3), dtype=np.float32)
+        self._quat_xyzw = np.array([0.0, 0.0, 0.0, 1.0], dtype=np.float32)
+
+        # With log_batch_frames > 1, poses are buffered in column arrays and
+        # sent with one rr.send_columns per entity on a "frame" timeline
+        self.log_batch_frames = max(1, int(viz_config.get('log_batch_frames', 1)))
+        nb = self.log_batch_frames
+        self._batch_frames = np.zeros(nb, dtype=np.int64)
+        self._batch_centers = np.zeros((nb, 3), dtype=np.float32)
+        self._batch_centers[:, 2] = self.vehicle_height / 2
+        self._batch_quats = np.zeros((nb, 4), dtype=np.float32)
+        self._batch_origins = np.zeros((nb, 3), dtype=np.float32)
+        self._batch_origins[:, 2] = self.vehicle_height
+        self._batch_vectors = np.zeros((nb, 3), dtype=np.float32)
+        self._batch_labels = [""] * nb
+        self._batch_fill = 0
+        self._batch_static_logged = False
 
         # Colors
         self.vehicle_color = [255, 200, 0, 255]
@@ -55,11 +90,17 @@ class SimulationVisualizer:
 
     def log_ground_plane(self, size: float = 20.0):
         """Log ground plane grid."""
-        lines = []
         step = 2.0
-        for i in np.arange(-size, size + step, step):
-            lines.append([[i, -size, 0], [i, size, 0]])
-            lines.append([[-size, i, 0], [size, i, 0]])
+        coords = np.arange(-size, size + step, step, dtype=np.float32)
+        n = len(coords)
+        # (2n, 2, 3): n lines along Y at each x, then n lines along X at each y
+        lines = np.zeros((2 * n, 2, 3), dtype=np.float32)
+        lines[:n, :, 0] = coords[:, None]
+        lines[:n, 0, 1] = -size
+        lines[:n, 1, 1] = size
+        lines[n:, :, 1] = coords[:, None]
+        lines[n:, 0, 0] = -size
+        lines[n:, 1, 0] = size
 
         rr.log(
             "world/ground_grid",
@@ -67,49 +108,67 @@ class SimulationVisualizer:
             static=True
         )
 
-    def log_waypoints(self, waypoints: list):
-        """Log path waypoints."""
+    def log_waypoints(self, waypoints):
+        """Log path waypoints (list of [x, y], (N, 2) or flat [x1, y1, ...] array)."""
         if len(waypoints) < 2:
             return
 
-        points_3d = [[wp[0], wp[1], 0.05] for wp in waypoints]
+        xy = np.asarray(waypoints, dtype=np.float32).reshape(-1, 2)
+        points_3d = np.pad(xy, ((0, 0), (0, 1)), constant_values=0.05)
 
         rr.log(
             "world/path",
-            rr.LineStrips3D([points_3d], colors=[self.path_color], radii=[0.05])
+            rr.LineStrips3D([points_3d], colors=[self.path_color], radii=[0.05]),
+            static=True
         )
 
         rr.log(
             "world/waypoints",
-            rr.Points3D(points_3d, colors=[self.path_color], radii=[0.1])
+            rr.Points3D(points_3d, colors=[self.path_color], radii=[0.1]),
+            static=True
         )
 
         self.waypoints_logged = True
 
     def log_vehicle(self, x: float, y: float, theta: float, velocity: float):
         """Log vehicle position and orientation."""
-        self.trail.append([x, y, 0.02])
+        n = self.trail_length
+        head = self._trail_head
+        self._trail_buf[head] = (x, y, 0.02)
+        self._trail_buf[head + n] = (x, y, 0.02)
+        self._trail_head = (head + 1) % n
+        self._trail_fill = min(self._trail_fill + 1, n)
+        frame = self._frame
+        self._frame += 1
+
+        # Yaw quaternion from the half angle; the arrow's cos/sin(theta)
+        # follow from the double-angle identities without more trig
+        qw = math.cos(theta / 2)
+        qz = math.sin(theta / 2)
+
+        if self.log_batch_frames > 1:
+            self._append_batch(frame, x, y, qz, qw, velocity)
+            return
 
         # Trail
-        if len(self.trail) > 1:
-            rr.log(
-                "world/vehicle_trail",
-                rr.LineStrips3D([list(self.trail)], colors=[self.trail_color], radii=[0.03])
-            )
+        if self._trail_fill > 1 and frame % self.trail_log_every == 0:
+            self._log_trail()
 
         # Vehicle box
-        center = [x, y, self.vehicle_height / 2]
-        half_sizes = [self.vehicle_length / 2, self.vehicle_width / 2, self.vehicle_height / 2]
+        center = self._center
+        center[0, 0] = x
+        center[0, 1] = y
 
-        qw = math.cos(theta / 2)
-        qz = math.sin(theta / 2)
-        rotation = rr.Quaternion(xyzw=[0, 0, qz, qw])
+        quat = self._quat_xyzw
+        quat[2] = qz
+        quat[3] = qw
+        rotation = rr.Quaternion(xyzw=quat)
 
         rr.log(
             "world/vehicle",
             rr.Boxes3D(
-                centers=[center],
-                half_sizes=[half_sizes],
+                centers=center,
+                half_sizes=self._half_sizes,
                 rotations=[rotation],
                 colors=[self.vehicle_color],
                 labels=[f"v={velocity:.2f}m/s"]
@@ -117,17 +176,101 @@ class SimulationVisualizer:
         )
 
         # Direction arrow
+        if frame % self.arrow_log_every:
+            return
+
         arrow_length = 0.8
+        origin = self._arrow_origin
+        origin[0, 0] = x
+        origin[0, 1] = y
+        vector = self._arrow_vector
+        vector[0, 0] = arrow_length * (qw * qw - qz * qz)
+        vector[0, 1] = arrow_length * (2.0 * qz * qw)
         rr.log(
             "world/vehicle_direction",
             rr.Arrows3D(
-                origins=[[x, y, self.vehicle_height]],
-                vectors=[[arrow_length * math.cos(theta), arrow_length * math.sin(theta), 0]],
+                origins=origin,
+                vectors=vector,
                 colors=[[255, 0, 0, 255]],
                 radii=[0.05]
             )
         )
 
+    def _log_trail(self):
+        """Log the current trail ring buffer as one line strip.
+
+        Both slices are row ranges of the (2 * trail_length, 3) buffer, so
+        they are C-contiguous float32 views and are handed to Rerun as-is.
+        """
+        n = self.trail_length
+        if self._trail_fill < n:
+            trail = self._trail_buf[:self._trail_fill]
+        else:
+            trail = self._trail_buf[self._trail_head:self._trail_head + n]
+        rr.log(
+            "world/vehicle_trail",
+            rr.LineStrips3D([trail], colors=[self.trail_color], radii=[0.03])
+        )
+
+    def _append_batch(self, frame: int, x: float, y: float, qz: float, qw: float,
+                      velocity: float):
+        """Buffer one pose; send the batch once log_batch_frames are collected."""
+        i = self._batch_fill
+        arrow_length = 0.8
+        self._batch_frames[i] = frame
+        self._batch_centers[i, :2] = (x, y)
+        self._batch_quats[i, 2:] = (qz, qw)
+        self._batch_origins[i, :2] = (x, y)
+        self._batch_vectors[i, :2] = (arrow_length * (qw * qw - qz * qz),
+                                      arrow_length * (2.0 * qz * qw))
+        self._batch_labels[i] = f"v={velocity:.2f}m/s"
+        self._batch_fill = i + 1
+        if self._batch_fill == self.log_batch_frames:
+            self.flush()
+
+    def flush(self):
+        """Send any buffered vehicle poses (batched mode only; rerun-sdk >= 0.23 column API)."""
+        k = self._batch_fill
+        if k == 0:
+            return
+
+        if not self._batch_static_logged:
+            # Per-frame constants are logged once instead of per column row
+            rr.log(
+                "world/vehicle",
+                rr.Boxes3D.from_fields(half_sizes=self._half_sizes,
+                                       colors=[self.vehicle_color]),
+                static=True
+            )
+            rr.log(
+                "world/vehicle_direction",
+                rr.Arrows3D.from_fields(colors=[[255, 0, 0, 255]], radii=[0.05]),
+                static=True
+            )
+            self._batch_static_logged = True
+
+        frames = [rr.TimeColumn("frame", sequence=self._batch_frames[:k])]
+        rr.send_columns(
+            "world/vehicle",
+            indexes=frames,
+            columns=rr.Boxes3D.columns(
+                centers=self._batch_centers[:k],
+                quaternions=self._batch_quats[:k],
+                labels=self._batch_labels[:k]
+            )
+        )
+        rr.send_columns(
+            "world/vehicle_direction",
+            indexes=frames,
+            columns=rr.Arrows3D.columns(
+                origins=self._batch_origins[:k],
+                vectors=self._batch_vectors[:k]
+            )
+        )
+        if self._trail_fill > 1:
+            self._log_trail()
+        self._batch_fill = 0
+
     def log_target_point(self, x: float, y: float):
         """Log current target point."""
         rr.log(
@@ -136,20 +279,13 @@ class SimulationVisualizer:
         )
 
 
-def load_waypoints(file_path: str) -> list:
-    """Load waypoints from file."""
-    waypoints = []
+def load_waypoints(file_path: str) -> np.ndarray:
+    """Load waypoints from file as an (N, 2) float32 array."""
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        waypoints.append([float(parts[0]), float(parts[1])])
+        return read_waypoints(file_path)
     except Exception as e:
         print(f"[Visualizer] Could not load waypoints: {e}")
-    return waypoints
+        return np.empty((0, 2), dtype=np.float32)
 
 
 class Operator:
@@ -160,28 +296,35 @@ class Operator:
         config_path = script_dir / "config" / "vehicle_params.yaml"
         sim_config_path = script_dir / "config" / "sim_config.yaml"
 
-        # Initialize Rerun
-        rr.init("DORA_NAV_Simulation")
+        # Initialize Rerun. Shorten the flush tick from Rerun's 0.2 s default
+        # so per-pose logs reach the viewer sooner, in smaller chunks.
+        os.environ.setdefault("RERUN_FLUSH_TICK_SECS", "0.05")
+        # A fixed recording id lets a restarted operator append to the
+        # recording already open in a long-running viewer
+        recording_id = os.environ.get("DORA_NAV_RECORDING_ID", "dora_nav_sim_v1")
+        rr.init("DORA_NAV_Simulation", recording_id=recording_id)
         rr.spawn()
 
-        rr.log("world", rr.ViewCoordinates.RIGHT_HAND_Z_UP, static=True)
-
         self.visualizer = SimulationVisualizer(str(config_path))
-        self.visualizer.log_ground_plane(size=15.0)
+
+        # Static scene setup is kept by the viewer for the recording; set
+        # DORA_NAV_REUSE_STATIC=1 when reconnecting to skip re-sending it
+        if os.environ.get("DORA_NAV_REUSE_STATIC") != "1":
+            rr.log("world", rr.ViewCoordinates.RIGHT_HAND_Z_UP, static=True)
+            self.visualizer.log_ground_plane(size=15.0)
 
         # Load waypoints
         if sim_config_path.exists():
-            with open(sim_config_path, 'r') as f:
-                sim_config = yaml.safe_load(f)
-                paths_config = sim_config.get('paths', {})
-                waypoints_file = paths_config.get('waypoints_file', '')
-
-                if waypoints_file:
-                    waypoints_path = script_dir / waypoints_file
-                    waypoints = load_waypoints(str(waypoints_path))
-                    if waypoints:
-                        self.visualizer.log_waypoints(waypoints)
-                        print(f"[Visualizer] Loaded {len(waypoints)} waypoints")
+            sim_config = load_yaml(sim_config_path)
+            paths_config = sim_config.get('paths', {})
+            waypoints_file = paths_config.get('waypoints_file', '')
+
+            if waypoints_file:
+                waypoints_path = script_dir / waypoints_file
+                waypoints = load_waypoints(str(waypoints_path))
+                if len(waypoints):
+                    self.visualizer.log_waypoints(waypoints)
+                    print(f"[Visualizer] Loaded {len(waypoints)} waypoints")
 
         print("[Visualizer] Initialized - Rerun window should open")
 
@@ -190,22 +333,24 @@ class Operator:
             event_id = dora_event["id"]
 
             if event_id == "sim_pose":
-                data = dora_event["value"].to_pylist()
+                data = dora_event["value"].to_numpy(zero_copy_only=False)
                 if len(data) >= 4:
-                    self.visualizer.log_vehicle(data[0], data[1], data[2], data[3])
+                    x, y, theta, velocity = data[:4].tolist()
+                    self.visualizer.log_vehicle(x, y, theta, velocity)
 
             elif event_id == "waypoints":
-                data = dora_event["value"].to_pylist()
+                data = dora_event["value"].to_numpy(zero_copy_only=False)
                 if len(data) >= 4:
-                    waypoints = [[data[i], data[i+1]] for i in range(0, len(data)-1, 2)]
-                    self.visualizer.log_waypoints(waypoints)
+                    self.visualizer.log_waypoints(data[:len(data) // 2 * 2])
 
             elif event_id == "target_point":
-                data = dora_event["value"].to_pylist()
+                data = dora_event["value"].to_numpy(zero_copy_only=False)
                 if len(data) >= 2:
-                    self.visualizer.log_target_point(data[0], data[1])
+                    x, y = data[:2].tolist()
+                    self.visualizer.log_target_point(x, y)
 
         elif dora_event["type"] == "STOP":
+            self.visualizer.flush()
             print("[Visualizer] Stopped")
             return DoraStatus.STOP
 
@@ -14,15 +14,76 @@ Outputs:
     - waypoints: Path waypoints for visualization
 """
 
+import bisect
 import math
-import yaml
 import os
+import sys
 from pathlib import Path
 
 import numpy as np
 import pyarrow as pa
 from dora import DoraStatus
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from sim_utils import load_yaml, read_waypoints  # noqa: E402
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _make_pp_kernel(wheelbase, max_steering):
+    """
+    Build a pure-pursuit steering kernel with the vehicle parameters baked in.
+
+    The returned steer(x, y, theta, tx, ty) gives the steering angle towards
+    (tx, ty), clamped to +/-max_steering.
+    """
+    two_wheelbase = 2.0 * wheelbase
+
+    def steer(x, y, theta, tx, ty):
+        dx = tx - x
+        dy = ty - y
+        c = math.cos(theta)
+        s = math.sin(theta)
+
+        local_x = dx * c + dy * s
+        local_y = -dx * s + dy * c
+        d2 = local_x * local_x + local_y * local_y
+
+        if d2 < 1e-4:
+            return 0.0
+
+        steering = math.atan(two_wheelbase * local_y / d2)
+        # Conditional expression lowers to a select rather than two min/max calls
+        return steering if -max_steering <= steering <= max_steering else (
+            max_steering if steering > 0.0 else -max_steering)
+
+    if NUMBA_AVAILABLE:
+        # Closure constants are frozen at compile time (closures can't be cached)
+        steer = njit(fastmath=True)(steer)
+    return steer
+
+
+def _closest_idx(xs, ys, x, y, lo, hi):
+    """Index and squared distance of the point in xs/ys[lo:hi] closest to (x, y)."""
+    best_i = lo
+    best_d2 = np.inf
+    for i in range(lo, hi):
+        dx = xs[i] - x
+        dy = ys[i] - y
+        d2 = dx * dx + dy * dy
+        if d2 < best_d2:
+            best_d2 = d2
+            best_i = i
+    return best_i, best_d2
+
+
+if NUMBA_AVAILABLE:
+    _closest_idx = njit(cache=True, fastmath=True)(_closest_idx)
+
 
 class PurePursuitController:
     """Pure pursuit path following controller."""
@@ -30,10 +91,9 @@ class PurePursuitController:
     def __init__(self, config_path: str = None):
         # Load configuration
         if config_path and os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                vehicle = config.get('vehicle', {})
-                controller = config.get('controller', {})
+            config = load_yaml(config_path)
+            vehicle = config.get('vehicle', {})
+            controller = config.get('controller', {})
         else:
             vehicle = {}
             controller = {}
@@ -49,101 +109,142 @@ class PurePursuitController:
         self.goal_tolerance = controller.get('goal_tolerance', 0.3)
         self.speed_target = controller.get('speed_target', 1.0)
 
-        self.waypoints = []
+        self.waypoints_xy = np.empty((0, 2), dtype=np.float32)
+        self.waypoints = self.waypoints_xy
+        self.cum_s = np.zeros(0, dtype=np.float32)
+        # Contiguous per-axis copies for the nearest-waypoint search, and
+        # Python-float mirrors for the per-tick scalar math
+        self.wp_x = np.zeros(0, dtype=np.float32)
+        self.wp_y = np.zeros(0, dtype=np.float32)
+        self._wp = []
+        self._cum_s = []
+        self._goal_x = 0.0
+        self._goal_y = 0.0
         self.current_waypoint_idx = 0
         self.goal_reached = False
         self.target_point = None
 
+        # Steering kernel specialized on the vehicle parameters
+        self._steer_kernel = _make_pp_kernel(float(self.wheelbase), float(self.max_steering))
+
+        # Warm up the JIT so the first control tick doesn't pay for compilation
+        self._steer_kernel(0.0, 0.0, 0.0, 1.0, 0.0)
+        if NUMBA_AVAILABLE:
+            _closest_idx(self.wp_x, self.wp_y, 0.0, 0.0, 0, 0)
+
     def load_waypoints(self, file_path: str) -> bool:
         """Load waypoints from file."""
-        self.waypoints = []
         try:
-            with open(file_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            self.waypoints.append(np.array([float(parts[0]), float(parts[1])]))
-            print(f"[Planner] Loaded {len(self.waypoints)} waypoints")
-            return len(self.waypoints) > 0
+            xy = read_waypoints(file_path)
         except Exception as e:
             print(f"[Planner] Error loading waypoints: {e}")
-            return False
+            xy = np.empty((0, 2), dtype=np.float32)
+
+        # Contiguous (N, 2) float32; `waypoints` is kept as an alias
+        self.waypoints_xy = xy
+        self.waypoints = self.waypoints_xy
+        self.wp_x = np.ascontiguousarray(self.waypoints_xy[:, 0])
+        self.wp_y = np.ascontiguousarray(self.waypoints_xy[:, 1])
+
+        # Cumulative arc length along the path, for lookahead by binary search
+        seg = np.diff(self.waypoints_xy, axis=0)
+        dist = np.sqrt((seg * seg).sum(axis=1))
+        self.cum_s = np.concatenate(([0.0], np.cumsum(dist))).astype(np.float32)
+        self._wp = self.waypoints_xy.tolist()
+        self._cum_s = self.cum_s.tolist()
+        if self._wp:
+            self._goal_x, self._goal_y = self._wp[-1]
+
+        if len(xy):
+            print(f"[Planner] Loaded {len(self.waypoints_xy)} waypoints")
+        return len(self.waypoints_xy) > 0
 
     def find_closest_waypoint_idx(self, x: float, y: float) -> int:
         """Find index of closest waypoint to current position."""
-        pos = np.array([x, y])
-        min_dist = float('inf')
-        closest_idx = 0
-
-        for i, wp in enumerate(self.waypoints):
-            dist = np.linalg.norm(wp - pos)
-            if dist < min_dist:
-                min_dist = dist
-                closest_idx = i
-
-        return closest_idx
+        idx, _ = self._nearest(x, y, 0, len(self.waypoints_xy))
+        return idx
+
+    def _nearest(self, x: float, y: float, lo: int, hi: int) -> tuple:
+        """Closest waypoint in [lo, hi); returns (index, squared distance)."""
+        if NUMBA_AVAILABLE:
+            return _closest_idx(self.wp_x, self.wp_y, x, y, lo, hi)
+        dx = self.wp_x[lo:hi] - x
+        dy = self.wp_y[lo:hi] - y
+        d2 = dx * dx + dy * dy
+        i = int(d2.argmin())
+        return lo + i, float(d2[i])
+
+    def _arc_position(self, x: float, y: float, idx: int) -> float:
+        """Arc length of (x, y) projected onto the segments adjacent to waypoint idx."""
+        wp, cum_s = self._wp, self._cum_s
+        best_s, best_d2 = cum_s[idx], float('inf')
+        for j in (idx - 1, idx):
+            if j < 0 or j + 1 >= len(wp):
+                continue
+            ax, ay = wp[j]
+            bx, by = wp[j + 1]
+            abx, aby = bx - ax, by - ay
+            seg_len2 = abx * abx + aby * aby
+            if seg_len2 <= 0.0:
+                continue
+            t = ((x - ax) * abx + (y - ay) * aby) / seg_len2
+            t = 0.0 if t < 0.0 else (1.0 if t > 1.0 else t)
+            dx = x - (ax + t * abx)
+            dy = y - (ay + t * aby)
+            d2 = dx * dx + dy * dy
+            if d2 < best_d2:
+                best_d2 = d2
+                best_s = cum_s[j] + t * (cum_s[j + 1] - cum_s[j])
+        return best_s
 
     def find_lookahead_point(self, x: float, y: float, velocity: float) -> tuple:
         """Find the lookahead point on the path."""
-        if not self.waypoints or self.goal_reached:
+        n = len(self.waypoints_xy)
+        if n == 0 or self.goal_reached:
             return None, -1
 
-        pos = np.array([x, y])
+        lookahead = self.min_lookahead + self.lookahead_ratio * abs(velocity)
+        lookahead = max(self.min_lookahead, min(self.max_lookahead, lookahead))
 
-        # Always find closest waypoint first to handle path deviation
-        closest_idx = self.find_closest_waypoint_idx(x, y)
+        # Find closest waypoint to handle path deviation. The vehicle only
+        # advances a few indices per tick, so search a window around the
+        # current index; scan the whole path on the first tick or off-track.
+        cur = self.current_waypoint_idx
+        closest_idx, d2 = self._nearest(x, y, max(0, cur - 8), min(n, cur + 64))
+        if cur == 0 or d2 > (2.0 * lookahead) ** 2:
+            closest_idx, _ = self._nearest(x, y, 0, n)
 
         # Only allow moving forward on path (prevent going backwards)
         if closest_idx > self.current_waypoint_idx:
             self.current_waypoint_idx = closest_idx
 
-        lookahead = self.min_lookahead + self.lookahead_ratio * abs(velocity)
-        lookahead = max(self.min_lookahead, min(self.max_lookahead, lookahead))
-
-        # Search from closest waypoint forward
-        for i in range(self.current_waypoint_idx, len(self.waypoints)):
-            wp = self.waypoints[i]
-            dist = np.linalg.norm(wp - pos)
-
-            if dist >= lookahead:
-                self.current_waypoint_idx = i
-                return wp, i
+        # Lookahead point: one lookahead of arc length past the vehicle's
+        # projection onto the path, interpolated within its segment
+        target_s = self._arc_position(x, y, self.current_waypoint_idx) + lookahead
+        i = bisect.bisect_left(self._cum_s, target_s)
+        if i < n:
+            if i == 0:
+                return tuple(self._wp[0]), 0
+            s0, s1 = self._cum_s[i - 1], self._cum_s[i]
+            t = (target_s - s0) / (s1 - s0) if s1 > s0 else 1.0
+            (ax, ay), (bx, by) = self._wp[i - 1], self._wp[i]
+            return (ax + t * (bx - ax), ay + t * (by - ay)), i
 
         # Near end of path
-        if len(self.waypoints) > 0:
-            last_wp = self.waypoints[-1]
-            dist_to_goal = np.linalg.norm(last_wp - pos)
+        dist_to_goal = math.hypot(self._goal_x - x, self._goal_y - y)
 
-            if dist_to_goal < self.goal_tolerance:
-                self.goal_reached = True
-                print("[Planner] Goal reached!")
-                return None, -1
-
-            return last_wp, len(self.waypoints) - 1
+        if dist_to_goal < self.goal_tolerance:
+            self.goal_reached = True
+            print("[Planner] Goal reached!")
+            return None, -1
 
-        return None, -1
+        return (self._goal_x, self._goal_y), n - 1
 
     def compute_steering(self, x: float, y: float, theta: float,
                          target_x: float, target_y: float) -> float:
         """Compute steering angle using pure pursuit."""
-        dx = target_x - x
-        dy = target_y - y
-
-        local_x = dx * math.cos(theta) + dy * math.sin(theta)
-        local_y = -dx * math.sin(theta) + dy * math.cos(theta)
-
-        lookahead_dist = math.sqrt(local_x**2 + local_y**2)
-
-        if lookahead_dist < 0.01:
-            return 0.0
-
-        curvature = 2 * local_y / (lookahead_dist**2)
-        steering = math.atan(self.wheelbase * curvature)
-        steering = max(-self.max_steering, min(self.max_steering, steering))
-
-        return steering
+        return self._steer_kernel(float(x), float(y), float(theta),
+                                  float(target_x), float(target_y))
 
     def compute_throttle(self, velocity: float, distance_to_goal: float) -> float:
         """Compute throttle command."""
@@ -157,13 +258,11 @@ class PurePursuitController:
 
         speed_error = target_speed - velocity
         throttle = 0.5 * speed_error
-        throttle = max(-1.0, min(1.0, throttle))
-
-        return throttle
+        return throttle if -1.0 <= throttle <= 1.0 else (1.0 if throttle > 0.0 else -1.0)
 
     def step(self, x: float, y: float, theta: float, velocity: float) -> dict:
         """Compute control commands for current state."""
-        if self.goal_reached or not self.waypoints:
+        if self.goal_reached or len(self.waypoints_xy) == 0:
             # Brake only if moving forward, otherwise hold position
             if velocity > 0.05:
                 throttle = -0.5  # Gentle brake when moving forward
@@ -192,8 +291,7 @@ class PurePursuitController:
         self.target_point = target
         steering = self.compute_steering(x, y, theta, target[0], target[1])
 
-        goal = self.waypoints[-1]
-        dist_to_goal = np.linalg.norm(goal - np.array([x, y]))
+        dist_to_goal = math.hypot(self._goal_x - x, self._goal_y - y)
         throttle = self.compute_throttle(velocity, dist_to_goal)
 
         return {
@@ -204,12 +302,9 @@ class PurePursuitController:
             'distance_to_goal': dist_to_goal
         }
 
-    def get_waypoints_flat(self) -> list:
-        """Get waypoints as flat list."""
-        flat = []
-        for wp in self.waypoints:
-            flat.extend([float(wp[0]), float(wp[1])])
-        return flat
+    def get_waypoints_flat(self) -> np.ndarray:
+        """Get waypoints as a flat float32 array [x1, y1, x2, y2, ...]."""
+        return self.waypoints_xy.ravel()
 
 
 class Operator:
@@ -224,17 +319,20 @@ class Operator:
 
         # Load waypoints
         if sim_config_path.exists():
-            with open(sim_config_path, 'r') as f:
-                sim_config = yaml.safe_load(f)
-                paths_config = sim_config.get('paths', {})
-                waypoints_file = paths_config.get('waypoints_file', '')
+            sim_config = load_yaml(sim_config_path)
+            paths_config = sim_config.get('paths', {})
+            waypoints_file = paths_config.get('waypoints_file', '')
 
-                if waypoints_file:
-                    waypoints_path = script_dir / waypoints_file
-                    self.controller.load_waypoints(str(waypoints_path))
+            if waypoints_file:
+                waypoints_path = script_dir / waypoints_file
+                self.controller.load_waypoints(str(waypoints_path))
 
         self.waypoints_sent = False
 
+        # Reused float32 output buffers; pa.array wraps them without boxing
+        self._one = np.zeros(1, dtype=np.float32)
+        self._two = np.zeros(2, dtype=np.float32)
+
         print(f"[Planner] Initialized: lookahead={self.controller.lookahead_distance}m, speed={self.controller.speed_target}m/s")
 
     def on_event(self, dora_event, send_output) -> str:
@@ -242,37 +340,40 @@ class Operator:
             event_id = dora_event["id"]
 
             if event_id == "sim_pose":
-                data = dora_event["value"].to_pylist()
+                data = dora_event["value"].to_numpy(zero_copy_only=False)
 
                 if len(data) >= 4:
-                    x, y, theta, velocity = data[0], data[1], data[2], data[3]
+                    x, y, theta, velocity = data[:4].tolist()
 
                     result = self.controller.step(x, y, theta, velocity)
 
+                    self._one[0] = result['steering']
                     send_output(
                         "steering_cmd",
-                        pa.array([result['steering']], type=pa.float32()),
+                        pa.array(self._one),
                         dora_event["metadata"]
                     )
 
+                    self._one[0] = result['throttle']
                     send_output(
                         "throttle_cmd",
-                        pa.array([result['throttle']], type=pa.float32()),
+                        pa.array(self._one),
                         dora_event["metadata"]
                     )
 
                     if result['target_point'] is not None:
+                        self._two[:] = result['target_point']
                         send_output(
                             "target_point",
-                            pa.array([float(result['target_point'][0]), float(result['target_point'][1])], type=pa.float32()),
+                            pa.array(self._two),
                             dora_event["metadata"]
                         )
 
-                    if not self.waypoints_sent and self.controller.waypoints:
+                    if not self.waypoints_sent and len(self.controller.waypoints_xy) > 0:
                         waypoints_flat = self.controller.get_waypoints_flat()
                         send_output(
                             "waypoints",
-                            pa.array(waypoints_flat, type=pa.float32()),
+                            pa.array(waypoints_flat),
                             dora_event["metadata"]
                         )
                         self.waypoints_sent = True